@@ -4,11 +4,22 @@ from sanic.response import json
 import importlib
 
 from base.config import settings
+from base.db import db
+from base.async_db import async_db
 from base.singleton import Singleton
 from base.auth import CustomAuth
+from base.batch import batch_route
+from base.cache import response_cache
+from base.stats import stats_route
+from base.sessions import session_refresher
+from base.tokens import token_denylist
 import apps.password.urls
 
 
+# The user of a request that was not resolved yet
+UNRESOLVED = object()
+
+
 async def main_route(request):
     return json({
         "message": "Human way to manage cryptic passwords"
@@ -16,9 +27,40 @@ async def main_route(request):
 
 
 class CustomRequest(Request):
+    """
+    The user of a request is resolved from its session (see `CustomAuth`)
+    the first time `resolve_user` is awaited, and kept for the rest of the
+    request. Requests that never need it cost no session lookup.
+
+    `user` and `is_authenticated` can only be read once the user is
+    resolved: controllers resolve it before running handlers that use it
+    (see `BaseController.needs_user`). Sub-requests of a batch share the
+    user of their `parent`.
+    """
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.user = None
+        self.db_scope_token = None
+        self.parent = None
+        self.__user = UNRESOLVED
+
+    async def resolve_user(self):
+        if self.parent is not None:
+            return await self.parent.resolve_user()
+        if self.__user is UNRESOLVED:
+            self.__user = await auth.current_user(self)
+        return self.__user
+
+    @property
+    def user(self):
+        if self.parent is not None:
+            return self.parent.user
+        if self.__user is UNRESOLVED:
+            raise RuntimeError("the user of the request is read before `resolve_user`")
+        return self.__user
+
+    @user.setter
+    def user(self, user):
+        self.__user = user
 
     @property
     def is_authenticated(self):
@@ -28,6 +70,9 @@ class CustomRequest(Request):
 class CustomApp(Sanic, metaclass=Singleton):
     def setup_routes(self):
         self.add_route(main_route, "/")
+        self.add_route(batch_route, "/batch", methods=["POST"])
+        if settings.STATS_ROUTE:
+            self.add_route(stats_route, "/stats")
 
         for app in settings.APPS:
             try:
@@ -41,6 +86,10 @@ class CustomApp(Sanic, metaclass=Singleton):
         # Prepend /api to all API URLs by default
         prepend = kwargs.pop("prepend", "/api")
         uri = "%s%s" % (prepend, args[1])
+        # Metadata that controllers only read per request is built now
+        view_class = getattr(args[0], "view_class", None)
+        if hasattr(view_class, "prepare_model_plan"):
+            view_class.prepare_model_plan()
         super().add_route(args[0], uri, **kwargs)
 
     def load_models(self):
@@ -59,14 +108,58 @@ app.config.SECRET_KEY = settings.SECRET_KEY
 auth = CustomAuth(app)
 
 
+def db_session_middleware(request):
+    request.db_scope_token = db.begin_request_scope()
+
+
+def db_session_cleanup_middleware(request, response):
+    if request.db_scope_token is not None:
+        db.end_request_scope(request.db_scope_token)
+        request.db_scope_token = None
+
+
 def session_middleware(request):
+    # The user is resolved later, if the request needs it
     auth.set_auth_token(request)
-    user = auth.current_user(request)
-    if user:
-        request.user = user
-    else:
-        request.user = None
 
 
+@app.listener('after_server_stop')
+async def close_async_db(app, loop):
+    await async_db.close()
+
+
+@app.listener('after_server_start')
+def sync_token_denylist(app, loop):
+    app.token_denylist_task = loop.create_task(token_denylist.run(auth.session_store()))
+
+
+@app.listener('before_server_stop')
+def stop_token_denylist(app, loop):
+    app.token_denylist_task.cancel()
+
+
+@app.listener('after_server_start')
+def refresh_sessions(app, loop):
+    app.session_refresher_task = loop.create_task(session_refresher.run(auth.session_store()))
+
+
+@app.listener('before_server_stop')
+async def stop_session_refresher(app, loop):
+    app.session_refresher_task.cancel()
+    await session_refresher.flush(auth.session_store())
+
+
+@app.listener('after_server_stop')
+async def close_session_store(app, loop):
+    await auth.session_store().close()
+
+
+@app.listener('after_server_stop')
+async def close_response_cache(app, loop):
+    await response_cache.close()
+
+
+app.register_middleware(db_session_middleware, attach_to='request')
 app.register_middleware(session_middleware, attach_to='request')
+app.register_middleware(db_session_cleanup_middleware, attach_to='response')
 app.setup_routes()
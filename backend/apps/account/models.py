@@ -1,9 +1,10 @@
 from enum import Enum as PyEnum
-from sqlalchemy import Column, String, DateTime, Enum, text
+from sqlalchemy import Column, String, DateTime, Enum, event, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import INET
 
 from base.models import SystemModel, BaseModel
+from base.user_cache import user_cache
 
 
 class AuthType(PyEnum):
@@ -27,6 +28,12 @@ class User(SystemModel):
     created_from = Column(INET, nullable=False)
 
 
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def invalidate_cached_user(mapper, connection, target):
+    user_cache.invalidate(target.id)
+
+
 class UserAuth(BaseModel):
     """
     This model is used to store the authentication mechanism for any user.
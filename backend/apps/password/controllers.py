@@ -1,4 +1,6 @@
+from base.constants import READ_ENGINE_ASYNCPG
 from base.controllers import BaseController, ListMixin
+from base.includes import Include
 from .models import Question
 from .schema import QuestionSchema
 
@@ -6,3 +8,13 @@ from .schema import QuestionSchema
 class QuestionListController(BaseController, ListMixin):
     model = Question
     schema_class = QuestionSchema
+    use_db_executor = True
+    read_engine = READ_ENGINE_ASYNCPG
+    cache_responses = True
+    use_etags = True
+    coalesce_requests = True
+    allowed_filters = ["id", "text", "data_type", "related_id"]
+    indexed_filters = ["id", "text", "related_id"]
+    includes = {
+        "related": Include(QuestionSchema)
+    }
@@ -25,7 +25,7 @@ class Question(SystemModel):
     data_type = Column(Enum(QuestionDataType), nullable=False, default=QuestionDataType.STRING)
 
     # A question may be related to a parent one, for example "date of marriage" is related to "are you married?"
-    related_id = Column(Integer, ForeignKey("question.id"), nullable=True)
+    related_id = Column(Integer, ForeignKey("question.id"), nullable=True, index=True)
 
 
 class Password(BaseModel):
@@ -41,7 +41,8 @@ class Password(BaseModel):
 class PasswordQuestion(SystemModel):
     __tablename__ = "password_question"
 
-    password_id = Column(Integer, ForeignKey("password.id"))
-    question_id = Column(Integer, ForeignKey("question.id"))
+    # Links are removed by the database with their password or question
+    password_id = Column(Integer, ForeignKey("password.id", ondelete="CASCADE"))
+    question_id = Column(Integer, ForeignKey("question.id", ondelete="CASCADE"))
 
     added_at = Column(DateTime, nullable=False, server_default=text("(now() at time zone 'utc')"))
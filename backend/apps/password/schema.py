@@ -1,5 +1,4 @@
-from marshmallow import Schema
-from base.schema import BaseSchema
+from base.schema import BaseSchema, CompiledSchema
 from base import schema_fields as fields
 
 
@@ -11,11 +10,14 @@ class QuestionSchema(BaseSchema):
 
 
 class PasswordSchema(BaseSchema):
+    # Filled in by controllers that include the questions, see `base.includes`
+    questions = fields.Nested(QuestionSchema, many=True, dump_only=True)
+
     class Meta:
         fields = ("id", "name", "questions")
 
 
-class AnswerItemSchema(Schema):
+class AnswerItemSchema(CompiledSchema):
     """
     This schema is used to collect individual answers to the questions that will generate a password.
     Since we never store the answers, this schema does not have a Model behind it.
@@ -25,7 +27,7 @@ class AnswerItemSchema(Schema):
     answer = fields.String(required=True)
 
 
-class AnswerSchema(Schema):
+class AnswerSchema(CompiledSchema):
     """
     This schema is used to collect the set of answers to generate a password.
     Since we never store the answers, this schema does not have a Model behind it.
@@ -35,7 +37,7 @@ class AnswerSchema(Schema):
     answers = fields.Nested(AnswerItemSchema, many=True)
 
 
-class GeneratedPasswordSchema(Schema):
+class GeneratedPasswordSchema(CompiledSchema):
     """
     This schema is used to return the generate password.
     This schema does not have a Model associated since the data is never stored.
@@ -0,0 +1,113 @@
+import asyncio
+from sqlalchemy.dialects.postgresql import psycopg2
+from sqlalchemy.engine.url import make_url
+
+from base.config import settings
+from base.db import db
+from base.rows import row_class
+from base.singleton import Singleton
+
+
+class AsyncDB(metaclass=Singleton):
+    """
+    An asyncpg connection pool to run read queries without blocking the
+    event loop.
+
+    Queries are still built with SQLAlchemy, they are compiled for PostgreSQL
+    here and only their execution happens on asyncpg. Rows come back as
+    lightweight row objects (see `base.rows`) with the same values that the
+    ORM would have loaded, so they can be handed to schemas directly.
+
+    asyncpg is imported only when the pool is first used, so it is needed
+    only when some controller reads through this engine.
+    """
+    __pool = None
+    # The psycopg2 dialect compiles to the "pyformat" param style, which we
+    # rewrite to the "$1" style of asyncpg. It does not import psycopg2.
+    dialect = psycopg2.dialect()
+
+    @property
+    def dsn(self):
+        url = make_url(settings.DATABASES["test" if db.is_test_mode else "default"])
+        url.drivername = "postgresql"
+        return str(url)
+
+    async def get_pool(self):
+        # The pool is created by a single task even when the first requests
+        # come in at the same time.
+        if self.__pool is None:
+            import asyncpg
+            self.__pool = asyncio.ensure_future(asyncpg.create_pool(
+                self.dsn,
+                min_size=settings.ASYNC_DB_POOL_MIN_SIZE,
+                max_size=settings.ASYNC_DB_POOL_MAX_SIZE
+            ))
+        return await self.__pool
+
+    async def close(self):
+        if self.__pool is not None:
+            pool = await self.__pool
+            self.__pool = None
+            await pool.close()
+
+    def compile(self, statement):
+        """
+        Compiles a SQLAlchemy statement to a SQL string and a list of
+        positional parameters for asyncpg.
+        """
+        compiled = statement.compile(dialect=self.dialect)
+        params = sorted(compiled.params.items())
+        placeholders = {
+            name: "$%d" % position for position, (name, _) in enumerate(params, start=1)
+        }
+        processors = compiled._bind_processors
+        values = [
+            processors[name](value) if name in processors else value
+            for name, value in params
+        ]
+        return compiled.string % placeholders, values
+
+    def get_result_processors(self, statement):
+        return [
+            c.type._cached_result_processor(self.dialect, None)
+            for c in statement.inner_columns
+        ]
+
+    def make_rows(self, statement, records):
+        cls = row_class(c.name for c in statement.inner_columns)
+        processors = self.get_result_processors(statement)
+        if not any(processors):
+            return [cls(*record) for record in records]
+        return [
+            cls(*[p(v) if p else v for p, v in zip(processors, record)])
+            for record in records
+        ]
+
+    async def fetch(self, statement):
+        """
+        Runs a SELECT statement and returns a list of row objects.
+        """
+        sql, values = self.compile(statement)
+        pool = await self.get_pool()
+        async with pool.acquire() as connection:
+            records = await connection.fetch(sql, *values)
+        return self.make_rows(statement, records)
+
+    async def iterate(self, statement, batch_size):
+        """
+        Runs a SELECT statement on a server side cursor and yields its rows
+        in lists of at most `batch_size` row objects.
+        """
+        sql, values = self.compile(statement)
+        pool = await self.get_pool()
+        async with pool.acquire() as connection:
+            async with connection.transaction():
+                cursor = await connection.cursor(sql, *values)
+                while True:
+                    records = await cursor.fetch(batch_size)
+                    if not records:
+                        break
+                    yield self.make_rows(statement, records)
+
+
+async_db = AsyncDB()
@@ -1,19 +1,49 @@
+import time
 import uuid
 from functools import partial, wraps
 from inspect import isawaitable
-from pymemcache.client.base import Client
 
 from sanic import response
 from sanic_auth import Auth
 from base.config import settings
+from base.constants import AUTH_TOKEN_SIGNED
+from base.db import db
+from base.memcache import AsyncMemcacheClient
+from base.rows import make_rows
+from base.sessions import (
+    session_expires_at, session_expiry, session_value, parse_session, session_refresher
+)
+from base.tokens import is_signed_token, sign_token, verify_token, token_denylist
+from base.user_cache import user_cache
 
 
 class CustomAuth(Auth):
+    """
+    Sessions map tokens to user ids in memcache, through a pooled asyncio
+    client (see `base.memcache`), so session lookups never block the event
+    loop. A session store that is down or slow fails calls with
+    `MemcacheError` after `SESSION_STORE_TIMEOUT` seconds.
+
+    Sessions expire `SESSION_TTL` seconds after login, or once they are not
+    used for `SESSION_IDLE_TTL` seconds (see `SessionRefresher`).
+
+    The user of a session is loaded from `user_cache` when it is there,
+    as a read-only snapshot of its row.
+
+    With `AUTH_TOKEN_MODE = signed`, logins issue signed tokens instead
+    (see `base.tokens`), which are verified without calling the store.
+    Signed tokens are accepted in both modes.
+    """
     __session_client__ = None
 
     def session_store(self):
         if not self.__session_client__:
-            self.__session_client__ = Client((settings.MEMCACHE_HOST, 11211))
+            self.__session_client__ = AsyncMemcacheClient(
+                settings.MEMCACHE_HOST,
+                11211,
+                pool_size=settings.SESSION_STORE_POOL_SIZE,
+                timeout=settings.SESSION_STORE_TIMEOUT
+            )
         return self.__session_client__
 
     def set_auth_token(self, request, auth_token=None):
@@ -24,32 +54,81 @@ class CustomAuth(Auth):
             auth_token = uuid.uuid4().hex
         self.auth_session_key = auth_token
 
-    def login_user(self, request, user, auth_token=None):
+    async def login_user(self, request, user, auth_token=None):
+        if settings.AUTH_TOKEN_MODE == AUTH_TOKEN_SIGNED and not auth_token:
+            return sign_token(self.serialize(user))
         if auth_token:
             self.set_auth_token(request, auth_token)
-            self.session_store().set(self.auth_session_key, self.serialize(user))
-        else:
-            self.session_store().set(self.auth_session_key, self.serialize(user))
-        return self.auth_session_key
+        auth_session_key = self.auth_session_key
+        expires_at = session_expires_at()
+        await self.session_store().set(
+            auth_session_key,
+            session_value(self.serialize(user), expires_at),
+            expire=session_expiry(expires_at)
+        )
+        return auth_session_key
 
     def serialize(self, user):
         return user.id
 
     def load_user(self, token):
-        from apps.account.models import User
-        return User.query.filter(User.id == token).first()
-
-    def current_user(self, request):
+        user = user_cache.get(token)
+        if user is None:
+            from apps.account.models import User
+            table = User.__table__
+            result = db.session.execute(table.select().where(table.c.id == token))
+            rows = make_rows(result.keys(), result.fetchall())
+            if not rows:
+                return None
+            user = rows[0]
+            user_cache.set(token, user)
+        return user
+
+    async def current_user(self, request):
         if "authorization" in request.headers:
             _, token = request.headers["authorization"].split(" ")
-            user_id = self.session_store().get(token)
-            if user_id is not None:
-                return self.load_user(int(user_id))
+            if is_signed_token(token):
+                claims = verify_token(token)
+                if claims is None or token_denylist.is_revoked(claims):
+                    return None
+                return self.load_user(claims.user_id)
+            try:
+                value = await self.session_store().get(token)
+            except ValueError:
+                # Not a token that could have been issued
+                return None
+            if value is not None:
+                user_id, expires_at = parse_session(value)
+                if expires_at and expires_at <= time.time():
+                    return None
+                session_refresher.refresh(token, expires_at)
+                return self.load_user(user_id)
         return None
 
-    def logout_user(self, request):
-        data = self.session_store().get(self.auth_session_key)
-        self.session_store().delete(self.auth_session_key)
+    def get_user(self, request):
+        """
+        Returns the user of the request, which requests of the app resolve
+        once (see `CustomRequest.resolve_user`).
+        """
+        if hasattr(request, "resolve_user"):
+            return request.resolve_user()
+        return self.current_user(request)
+
+    async def logout_user(self, request):
+        # Read before awaiting, other requests set their own key meanwhile
+        auth_session_key = self.auth_session_key
+        if is_signed_token(auth_session_key):
+            claims = verify_token(auth_session_key)
+            if claims is None:
+                return None
+            await token_denylist.revoke(self.session_store(), claims)
+            user_cache.invalidate(claims.user_id)
+            return claims.user_id
+        session_refresher.forget(auth_session_key)
+        data = await self.session_store().get(auth_session_key)
+        await self.session_store().delete(auth_session_key)
+        if data is not None:
+            user_cache.invalidate(parse_session(data)[0])
         return data
 
     def login_required(
@@ -70,7 +149,7 @@ class CustomAuth(Auth):
                 request, = args
             elif len(args) == 2:
                 _, request = args
-            user = self.current_user(request)
+            user = self.get_user(request)
             if isawaitable(user):
                 user = await user
 
@@ -123,7 +202,7 @@ class CustomAuth(Auth):
                     request, = args
                 elif len(args) == 2:
                     _, request = args
-                user = self.current_user(request)
+                user = self.get_user(request)
                 if isawaitable(user):
                     user = await user
 
@@ -166,6 +245,8 @@ def login_required(func, *args, **kwargs):
                 "message": "unauthenticated"
             }, status=401)
 
+    # Controllers resolve the user of the request before calling it
+    inner.requires_user = True
     return inner
 
 
@@ -197,6 +278,8 @@ def owner_required(func, *args, **kwargs):
                 "message": "unauthenticated"
             }, status=401)
 
+    # Controllers resolve the user of the request before calling it
+    inner.requires_user = True
     return inner
 
 
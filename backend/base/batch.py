@@ -0,0 +1,203 @@
+import json
+from inspect import isawaitable
+from urllib.parse import urlencode
+
+from sanic import response
+from sanic.exceptions import NotFound
+from sanic.response import json_dumps, HTTPResponse
+from sanic.server import CIDict
+
+from base.cache import response_cache
+from base.config import settings
+from base.controllers import BaseController
+from base.db import db
+from base.error_handler import Error, ErrorType
+from base.constants import (
+    POST_REQUEST, PUT_REQUEST, PATCH_REQUEST, GET_REQUEST, DELETE_REQUEST
+)
+
+
+# Methods that sub-requests of a batch can use, and those that write
+BATCH_METHODS = (GET_REQUEST, POST_REQUEST, PUT_REQUEST, PATCH_REQUEST, DELETE_REQUEST)
+WRITE_METHODS = (POST_REQUEST, PUT_REQUEST, PATCH_REQUEST, DELETE_REQUEST)
+
+# Status of the sub-requests of an atomic batch that were not run because
+# an earlier one failed
+STATUS_NOT_RUN = 424
+
+
+class InvalidBatch(Exception):
+    def __init__(self, field, context=None):
+        super().__init__(field)
+        self.field = field
+        self.context = context
+
+
+def parse_batch(data):
+    """
+    Returns the sub-requests of the body of a batch request and whether they
+    run in one transaction, raises InvalidBatch if they cannot be run.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("requests"), list):
+        raise InvalidBatch("requests")
+    items = data["requests"]
+    if not items or len(items) > settings.BATCH_MAX_REQUESTS:
+        raise InvalidBatch("requests", context="1 to %d requests" % settings.BATCH_MAX_REQUESTS)
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise InvalidBatch("requests.%d" % index)
+        item.setdefault("method", GET_REQUEST)
+        if item["method"] not in BATCH_METHODS:
+            raise InvalidBatch("requests.%d.method" % index)
+        path = item.get("path")
+        if not isinstance(path, str) or not path.startswith("/"):
+            raise InvalidBatch("requests.%d.path" % index)
+        if not isinstance(item.get("query", {}), dict) or not isinstance(item.get("headers", {}), dict):
+            raise InvalidBatch("requests.%d" % index)
+    return items, bool(data.get("atomic", False))
+
+
+def make_sub_request(request, item):
+    """
+    Returns a request of the same class as the batch request, for the path,
+    query, headers and JSON body of a sub-request. It has the user of the
+    batch request (resolved once for all of them), the session middleware
+    does not run again.
+    """
+    url = item["path"]
+    if item.get("query"):
+        url = "%s?%s" % (url, urlencode(item["query"], doseq=True))
+    headers = CIDict()
+    for name, value in (item.get("headers") or {}).items():
+        headers[name] = str(value)
+    if "authorization" in request.headers:
+        headers["authorization"] = request.headers["authorization"]
+    sub_request = type(request)(url.encode("utf-8"), headers, request.version, item["method"],
+                                request.transport)
+    sub_request.app = request.app
+    sub_request.body = json_dumps(item["body"]).encode("utf-8") if item.get("body") is not None else b""
+    sub_request.parent = request
+    return sub_request
+
+
+def get_controller(request, sub_request):
+    """
+    Returns the view of the route of a sub-request, its arguments and the
+    controller class, or raises NotFound (or InvalidUsage for a method the
+    route does not have). Only routes of controllers can be batched.
+    """
+    handler, args, kwargs, uri = request.app.router.get(sub_request)
+    sub_request.uri_template = uri
+    view_class = getattr(handler, "view_class", None)
+    if view_class is None or not issubclass(view_class, BaseController):
+        raise NotFound("Requested URL {} cannot be batched".format(sub_request.path))
+    return handler, args, kwargs, view_class
+
+
+async def run_sub_request(request, sub_request):
+    """
+    Runs a sub-request in-process, on the controller of its route, and
+    returns its response and controller class (None if there is no route).
+    """
+    view_class = None
+    try:
+        handler, args, kwargs, view_class = get_controller(request, sub_request)
+        resp = handler(sub_request, *args, **kwargs)
+        if isawaitable(resp):
+            resp = await resp
+    except Exception as e:
+        resp = request.app.error_handler.response(sub_request, e)
+        if isawaitable(resp):
+            resp = await resp
+    if type(resp) is not HTTPResponse:
+        # Streamed responses are written straight to the client
+        errors = Error.generate_error(
+            data={
+                "error_code": Error.INVALID_VALUE,
+                "field": "stream",
+                "context": "streamed responses cannot be batched"
+            },
+            type=ErrorType.CUSTOM_ERRORS
+        )
+        resp = response.json(errors, status=400)
+    return resp, view_class
+
+
+def dump_response(resp):
+    try:
+        body = json.loads(resp.body.decode("utf-8")) if resp.body else None
+    except ValueError:
+        body = resp.body.decode("utf-8", "replace")
+    return {"status": resp.status, "headers": dict(resp.headers), "body": body}
+
+
+async def run_batch(request, items):
+    results = []
+    for item in items:
+        token = db.begin_request_scope()
+        try:
+            resp, _ = await run_sub_request(request, make_sub_request(request, item))
+        finally:
+            db.end_request_scope(token)
+        results.append(dump_response(resp))
+    return results
+
+
+async def run_atomic_batch(request, items):
+    """
+    Runs the sub-requests in one database transaction. It is committed if
+    all of them succeed, the first one that fails rolls it back and the
+    ones after it are not run.
+
+    Only the SQLAlchemy sessions join the transaction, GET requests of
+    controllers that read with asyncpg do not see its writes.
+    """
+    results = []
+    tables = set()
+    with db.shared_transaction() as transaction:
+        for item in items:
+            if results and results[-1]["status"] >= 400:
+                results.append({"status": STATUS_NOT_RUN, "headers": {}, "body": None})
+                continue
+            resp, view_class = await run_sub_request(request, make_sub_request(request, item))
+            if item["method"] in WRITE_METHODS and getattr(view_class, "model", None) is not None:
+                tables.add(view_class.model.__table__.name)
+            results.append(dump_response(resp))
+        if results[-1]["status"] < 400:
+            transaction.commit()
+        else:
+            transaction.rollback()
+    # Responses cached while the transaction was open may hold writes that
+    # were rolled back, or be older than the commit.
+    response_cache.invalidate(*tables)
+    return results
+
+
+async def batch_route(request):
+    """
+    Runs a list of sub-requests (`{"requests": [{"method": "GET", "path":
+    "/api/q", "query": {...}, "headers": {...}, "body": {...}}, ...]}`) on
+    the controllers of their routes, in order and without going through
+    HTTP, and returns all of their responses.
+
+    With `"atomic": true` the writes of the sub-requests are made in one
+    database transaction, see `run_atomic_batch`.
+    """
+    try:
+        items, atomic = parse_batch(request.json)
+    except InvalidBatch as error:
+        errors = Error.generate_error(
+            data={
+                "error_code": Error.INVALID_VALUE,
+                "field": error.field,
+                "context": error.context
+            },
+            type=ErrorType.CUSTOM_ERRORS
+        )
+        return response.json(errors, status=400)
+
+    if atomic:
+        results = await run_atomic_batch(request, items)
+    else:
+        results = await run_batch(request, items)
+    return response.json({"responses": results})
@@ -0,0 +1,237 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from sanic.response import json_dumps
+
+from base.config import settings
+from base.memcache import AsyncMemcacheClient, MemcacheError
+from base.singleton import Singleton
+
+
+# A response as it is kept in the cache. The body is the encoded JSON
+CachedResponse = namedtuple("CachedResponse", ("status", "headers", "content_type", "body"))
+
+
+class LRUCache(object):
+    """
+    A dict bounded in size, where the least recently used entries are
+    dropped first, and whose entries expire `ttl` seconds after they are
+    set. It can be used from the database executor threads.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + self.ttl, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+class ResponseCache(metaclass=Singleton):
+    """
+    Cache of the responses of read controllers (see `ResponseCacheMixin` in
+    `base.controllers`), in an in-process LRU and, if
+    `RESPONSE_CACHE_MEMCACHE` is set, in memcache as a second tier shared by
+    all the processes.
+
+    Entries are grouped by the table they are read from. Each table has a
+    generation number that is part of the keys of its entries, and writes
+    invalidate the entries of a table by bumping its generation, old entries
+    are never read again and age out of the cache. The generation is read
+    before the response is built, so a response that raced with a write is
+    stored under the old generation and never served.
+
+    Without memcache, generations live in the process, so other processes
+    can serve entries up to `RESPONSE_CACHE_TTL` seconds old after a write.
+    With memcache, generations are kept there and every process sees writes
+    at once. Requests handled on the event loop (`handle_get_async`) use the
+    `async_*` methods, which go through the asyncio memcache client (see
+    `base.memcache`) instead of blocking the loop.
+    """
+    __local = None
+    __memcache = None
+    __async_memcache = None
+    __generations = {}
+    __lock = threading.Lock()
+
+    @property
+    def local(self):
+        if self.__local is None:
+            self.__local = LRUCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL)
+        return self.__local
+
+    @property
+    def memcache(self):
+        if self.__memcache is None and settings.RESPONSE_CACHE_MEMCACHE:
+            from pymemcache.client.base import PooledClient
+            self.__memcache = PooledClient((settings.MEMCACHE_HOST, 11211))
+        return self.__memcache
+
+    @property
+    def async_memcache(self):
+        if self.__async_memcache is None and settings.RESPONSE_CACHE_MEMCACHE:
+            self.__async_memcache = AsyncMemcacheClient(
+                settings.MEMCACHE_HOST,
+                11211,
+                pool_size=settings.SESSION_STORE_POOL_SIZE,
+                timeout=settings.SESSION_STORE_TIMEOUT
+            )
+        return self.__async_memcache
+
+    def generation_key(self, table_name):
+        return "resp-gen:%s" % table_name
+
+    def make_generations(self, table_names, values):
+        generations = []
+        for table_name in table_names:
+            value = values.get(self.generation_key(table_name))
+            if value is not None:
+                generations.append(int(value))
+            else:
+                generations.append(self.__generations.get(table_name, 0))
+        return tuple(generations)
+
+    def get_generations(self, table_names):
+        """
+        Returns the generations of the tables, in the same order.
+        """
+        values = {}
+        if self.memcache is not None:
+            try:
+                values = self.memcache.get_many([self.generation_key(name) for name in table_names])
+            except Exception:
+                pass
+        return self.make_generations(table_names, values)
+
+    async def async_get_generations(self, table_names):
+        values = {}
+        if self.async_memcache is not None:
+            try:
+                values = await self.async_memcache.get_many(
+                    [self.generation_key(name) for name in table_names]
+                )
+            except MemcacheError:
+                pass
+        return self.make_generations(table_names, values)
+
+    def get_generation(self, table_name):
+        return self.get_generations([table_name])[0]
+
+    def invalidate(self, *table_names):
+        for table_name in table_names:
+            with self.__lock:
+                self.__generations[table_name] = self.__generations.get(table_name, 0) + 1
+            if self.memcache is not None:
+                key = self.generation_key(table_name)
+                try:
+                    if self.memcache.incr(key, 1) is None:
+                        # A generation lost by memcache starts again from the
+                        # time, which is beyond any generation used before.
+                        self.memcache.add(key, str(int(time.time() * 1000)), noreply=False)
+                except Exception:
+                    pass
+
+    def memcache_key(self, key):
+        return "resp:%s" % hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+    def make_key(self, table_names, generations, key):
+        return (tuple(table_names), generations) + tuple(key)
+
+    def encode(self, cached):
+        return json_dumps([
+            cached.status, cached.headers, cached.content_type, cached.body.decode("utf-8")
+        ])
+
+    def decode(self, value):
+        status, headers, content_type, body = json.loads(value)
+        return CachedResponse(status, headers, content_type, body.encode("utf-8"))
+
+    def get(self, table_names, generations, key):
+        """
+        Returns the full key of a response read from the tables at their
+        `generations` (to be passed on to `set`) and the cached response, or
+        None.
+        """
+        key = self.make_key(table_names, generations, key)
+        cached = self.local.get(key)
+        if cached is None and self.memcache is not None:
+            try:
+                value = self.memcache.get(self.memcache_key(key))
+            except Exception:
+                value = None
+            if value is not None:
+                cached = self.decode(value)
+                self.local.set(key, cached)
+        return key, cached
+
+    async def async_get(self, table_names, generations, key):
+        key = self.make_key(table_names, generations, key)
+        cached = self.local.get(key)
+        if cached is None and self.async_memcache is not None:
+            try:
+                value = await self.async_memcache.get(self.memcache_key(key))
+            except MemcacheError:
+                value = None
+            if value is not None:
+                cached = self.decode(value)
+                self.local.set(key, cached)
+        return key, cached
+
+    def set(self, key, cached):
+        self.local.set(key, cached)
+        if self.memcache is not None:
+            try:
+                self.memcache.set(self.memcache_key(key), self.encode(cached), expire=settings.RESPONSE_CACHE_TTL)
+            except Exception:
+                pass
+
+    async def async_set(self, key, cached):
+        self.local.set(key, cached)
+        if self.async_memcache is not None:
+            try:
+                await self.async_memcache.set(
+                    self.memcache_key(key), self.encode(cached), expire=settings.RESPONSE_CACHE_TTL
+                )
+            except MemcacheError:
+                pass
+
+    async def close(self):
+        if self.__async_memcache is not None:
+            await self.__async_memcache.close()
+
+    def clear(self):
+        self.local.clear()
+
+
+response_cache = ResponseCache()
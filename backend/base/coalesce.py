@@ -0,0 +1,70 @@
+import asyncio
+from collections import Counter
+
+from base.singleton import Singleton
+
+
+class SingleFlight(metaclass=Singleton):
+    """
+    Coalesces identical concurrent work: while a call for a key is in
+    flight, other calls for the same key wait for it and share its result
+    instead of running again.
+
+    If the call in flight fails (or the request that runs it goes away) the
+    waiting calls run on their own, so a failure is never shared.
+
+    Counters of calls that ran and calls that were coalesced are kept per
+    name (the controller), see `stats`.
+    """
+    __in_flight = {}
+    __executed = Counter()
+    __coalesced = Counter()
+
+    async def run(self, name, key, func):
+        """
+        Returns the result of `await func()`, or the result of the call in
+        flight for the same name and key, and whether it was shared.
+        """
+        key = (name, key)
+        future = self.__in_flight.get(key)
+        if future is not None:
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # This request itself was cancelled
+                    raise
+            else:
+                self.__coalesced[name] += 1
+                return result, True
+            return await self.run(name, key[1], func)
+
+        future = asyncio.get_event_loop().create_future()
+        self.__in_flight[key] = future
+        self.__executed[name] += 1
+        try:
+            result = await func()
+        except BaseException:
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            if self.__in_flight.get(key) is future:
+                del self.__in_flight[key]
+
+    def stats(self):
+        return {
+            name: {
+                "executed": self.__executed[name],
+                "coalesced": self.__coalesced[name]
+            } for name in set(self.__executed) | set(self.__coalesced)
+        }
+
+    def reset_stats(self):
+        self.__executed.clear()
+        self.__coalesced.clear()
+
+
+single_flight = SingleFlight()
@@ -1,5 +1,5 @@
 import os
-from decouple import config
+from decouple import config, Csv
 
 from base.singleton import Singleton
 
@@ -34,6 +34,57 @@ class Settings(metaclass=Singleton):
     DEFAULT_SUBJECT_PREFIX = config("DEFAULT_SUBJECT_PREFIX", cast=str, default="")
 
     SECRET_KEY = config("SECRET_KEY", cast=str)
+    # Keys that were rotated out, signed tokens issued with them stay valid
+    SECRET_KEY_FALLBACKS = config("SECRET_KEY_FALLBACKS", cast=Csv(), default="")
+
+    # Blocking database work of controllers can be run on a bounded thread
+    # pool so that the event loop stays free for I/O. Requests beyond
+    # pool size + queue depth are rejected as busy.
+    DB_EXECUTOR_POOL_SIZE = config("DB_EXECUTOR_POOL_SIZE", cast=int, default=10)
+    DB_EXECUTOR_QUEUE_DEPTH = config("DB_EXECUTOR_QUEUE_DEPTH", cast=int, default=100)
+
+    # Connection pool of the asyncpg read engine, used by controllers
+    # with read_engine = READ_ENGINE_ASYNCPG
+    ASYNC_DB_POOL_MIN_SIZE = config("ASYNC_DB_POOL_MIN_SIZE", cast=int, default=2)
+    ASYNC_DB_POOL_MAX_SIZE = config("ASYNC_DB_POOL_MAX_SIZE", cast=int, default=10)
+
+    MEMCACHE_HOST = config("MEMCACHE_HOST", cast=str, default="127.0.0.1")
+
+    # Connections of each worker to the session store (memcache) and
+    # seconds a call to it can take before it fails
+    SESSION_STORE_POOL_SIZE = config("SESSION_STORE_POOL_SIZE", cast=int, default=10)
+    SESSION_STORE_TIMEOUT = config("SESSION_STORE_TIMEOUT", cast=float, default=0.5)
+
+    # Seconds sessions last after login and without being used (0 for no
+    # limit), and seconds between two refreshes of a session in use
+    SESSION_TTL = config("SESSION_TTL", cast=int, default=30 * 24 * 3600)
+    SESSION_IDLE_TTL = config("SESSION_IDLE_TTL", cast=int, default=7 * 24 * 3600)
+    SESSION_REFRESH_INTERVAL = config("SESSION_REFRESH_INTERVAL", cast=int, default=300)
+
+    # Users that requests are authenticated as are cached in each process:
+    # most users kept, and seconds other processes can see an outdated user
+    USER_CACHE_SIZE = config("USER_CACHE_SIZE", cast=int, default=4096)
+    USER_CACHE_TTL = config("USER_CACHE_TTL", cast=int, default=30)
+
+    # Tokens issued on login: memcache sessions (AUTH_TOKEN_SESSION) or
+    # signed tokens verified without the store (AUTH_TOKEN_SIGNED), seconds
+    # signed tokens are valid and seconds between syncs of the revoked ones
+    AUTH_TOKEN_MODE = config("AUTH_TOKEN_MODE", cast=str, default="session")
+    SIGNED_TOKEN_TTL = config("SIGNED_TOKEN_TTL", cast=int, default=86400)
+    TOKEN_DENYLIST_SYNC_INTERVAL = config("TOKEN_DENYLIST_SYNC_INTERVAL", cast=int, default=10)
+
+    # Cache of GET responses of controllers with cache_responses = True:
+    # most entries and seconds they are kept in each process, and whether
+    # memcache is used as a second tier shared by all processes
+    RESPONSE_CACHE_SIZE = config("RESPONSE_CACHE_SIZE", cast=int, default=1024)
+    RESPONSE_CACHE_TTL = config("RESPONSE_CACHE_TTL", cast=int, default=300)
+    RESPONSE_CACHE_MEMCACHE = config("RESPONSE_CACHE_MEMCACHE", cast=bool, default=False)
+
+    # Whether the counters of the caches are served at /api/stats
+    STATS_ROUTE = config("STATS_ROUTE", cast=bool, default=False)
+
+    # Most sub-requests a request to /api/batch can have
+    BATCH_MAX_REQUESTS = config("BATCH_MAX_REQUESTS", cast=int, default=20)
 
     APPS = (
         'account',
@@ -1,5 +1,19 @@
 # methods
 POST_REQUEST = "POST"
 PUT_REQUEST = "PUT"
+PATCH_REQUEST = "PATCH"
 GET_REQUEST = "GET"
 DELETE_REQUEST = "DELETE"
+
+# engines that read queries of controllers can run on
+READ_ENGINE_ORM = "orm"
+READ_ENGINE_CORE = "core"
+READ_ENGINE_ASYNCPG = "asyncpg"
+
+# formats of streamed list responses
+STREAM_NDJSON = "ndjson"
+STREAM_JSON = "json"
+
+# tokens issued on login
+AUTH_TOKEN_SESSION = "session"
+AUTH_TOKEN_SIGNED = "signed"
@@ -1,11 +1,30 @@
+import itertools
+from functools import partial
+from inspect import getattr_static, isawaitable
 from sanic.views import HTTPMethodView
 from sanic import response
-from sqlalchemy.orm.exc import NoResultFound
+from sanic.response import json_dumps, HTTPResponse
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 from sqlalchemy.exc import IntegrityError
 
-from base.db import db
+from base.db import db, Base
+from base.async_db import async_db
+from base.cache import response_cache, CachedResponse
+from base.coalesce import single_flight
 from base.error_handler import Error, ErrorType
-from base.constants import POST_REQUEST, PUT_REQUEST, GET_REQUEST, DELETE_REQUEST
+from base.etags import make_etag, etag_matches
+from base.executor import executor, ExecutorBusy
+from base.filters import InvalidQueryArgument, parse_filter_arg, build_filter, FILTER_OPERATORS
+from base.model_plan import model_plan
+from base.pagination import KeysetPage
+from base.rows import make_rows, schema_columns
+from base.unit_of_work import save_batched
+from base.constants import (
+    POST_REQUEST, PUT_REQUEST, PATCH_REQUEST, GET_REQUEST, DELETE_REQUEST, READ_ENGINE_ORM,
+    READ_ENGINE_CORE, READ_ENGINE_ASYNCPG, STREAM_NDJSON, STREAM_JSON
+)
 
 
 class QueryFilter(object):
@@ -18,13 +37,25 @@ class QueryFilter(object):
 
     If `filter_by_creator` is True, and if the model has a `created_by_id`
     then the model is filtered by current user, which is request.user.id
+
+    `allowed_filters` lists the model fields that clients can filter on in
+    the query string, `?<field>=<value>` or `?<field>__<operator>=<value>`
+    where the operator is one of `eq`, `in`, `range` or `prefix` (see
+    `base.filters`). The filters are applied in SQL. Fields that are not in
+    `indexed_filters` (backed by a database index) can only be used in test
+    mode, production requests that use them are rejected.
     """
     url_parts = {}
     filter_by_creator = False
     allowed_filters = []
+    indexed_filters = []
+    reserved_query_args = ("limit", "after", "before", "stream", "fields", "include")
 
     def get_default_filters(self, *args, **kwargs):
-        pass
+        """
+        Filters that always apply to the model, override as needed.
+        """
+        return []
 
     def get_url_parts_filters(self):
         """
@@ -32,79 +63,819 @@ class QueryFilter(object):
         the item that we need. The filter values will most probably come
         from URL parts.
         """
+        return self.get_item_filters() + self.get_creator_filters()
+
+    def get_item_filters(self):
+        """
+        Filters of the URL parts only, without the creator filter.
+        """
         filters = []
-        m = self.get_model()
         ua = self.url_parts
         for k, v in self.kwargs.items():
             if k in ua:
                 filters.append(ua[k] == self.kwargs[k])
-        if self.filter_by_creator and hasattr(m, "created_by_id"):
-            filters.append(getattr(m, "created_by_id") == self.request.user.id)
         return filters
 
+    def get_creator_filters(self):
+        m = self.get_model()
+        if self.filter_by_creator and hasattr(m, "created_by_id"):
+            return [getattr(m, "created_by_id") == self.request.user.id]
+        return []
+
+    def get_unauthenticated_response(self):
+        """
+        Returns a 401 response for writes to rows filtered by their creator
+        without a user (see `filter_by_creator`), None otherwise.
+        """
+        if (self.filter_by_creator and hasattr(self.get_model(), "created_by_id") and
+                not self.request.user):
+            return response.json({
+                "message": "unauthenticated"
+            }, status=401)
+        return None
+
+    def get_multiple_items_error(self):
+        # URL parts that match several rows do not identify one item
+        return Error.generate_error(
+            data={
+                "error_code": Error.INVALID_VALUE,
+                "field": None,
+                "context": "the URL matches several items"
+            },
+            type=ErrorType.CUSTOM_ERRORS
+        )
+
+    def get_filter(self, arg, value):
+        field, operator = parse_filter_arg(arg)
+        if field not in self.allowed_filters or operator not in FILTER_OPERATORS:
+            raise InvalidQueryArgument(arg)
+        if field not in self.indexed_filters and not db.is_test_mode:
+            raise InvalidQueryArgument(arg, context="not an indexed filter")
+        column = self.get_model().__table__.columns[field]
+        try:
+            return build_filter(column, operator, value)
+        except (ValueError, KeyError, TypeError):
+            raise InvalidQueryArgument(arg)
+
     def get_url_query_filters(self, *args, **kwargs):
-        pass
+        """
+        Get a list of SQLAlchemy model filters from the query string of the
+        request, for the fields in `allowed_filters`. Controllers without
+        `allowed_filters` ignore the query string, other arguments (like
+        cache busters) are only rejected by controllers that filter.
+        """
+        if not self.allowed_filters:
+            return []
+        filters = []
+        for arg in self.request.args.keys():
+            if arg in self.reserved_query_args:
+                continue
+            filters.append(self.get_filter(arg, self.request.args.get(arg)))
+        return filters
 
     def get_json_filters(self, *args, **kwargs):
-        pass
+        """
+        Get a list of SQLAlchemy model filters from a JSON object in the
+        request body, like `{"related_id__in": [1, 2]}`.
+        """
+        data = self.request.json
+        if not data:
+            return []
+        if not isinstance(data, dict):
+            raise InvalidQueryArgument(None)
+        return [self.get_filter(arg, value) for arg, value in data.items()]
 
     def get_all_filters(self, *args, **kwargs):
-        pass
+        return (
+            self.get_default_filters() +
+            self.get_url_parts_filters() +
+            self.get_url_query_filters()
+        )
+
+    def handle_invalid_query_argument(self, error):
+        errors = Error.generate_error(
+            data={
+                "error_code": Error.INVALID_VALUE,
+                "field": error.field,
+                "context": error.context
+            },
+            type=ErrorType.CUSTOM_ERRORS
+        )
+        return response.json(errors, status=400)
 
 
 class SerializerMixin(object):
+    """
+    Reads only select the columns that the schema dumps. Schema fields map
+    to the model columns of the same name (or `attribute`), `Function` and
+    `Method` fields included. If one of those is named after something else
+    we cannot tell which columns it reads, so all columns are selected.
+
+    Clients can ask for fewer fields with `?fields=<name>,<name>`, the
+    schema then dumps (and the query selects) only those.
+    """
     model = None
     schema_class = None
+    sparse_fields = None
 
     def get_schema(self, instance=None):
+        kwargs = {}
+        if self.sparse_fields:
+            kwargs["only"] = self.sparse_fields
         if instance:
-            return self.schema_class(instance=instance)
-        else:
-            return self.schema_class()
+            kwargs["instance"] = instance
+        return self.schema_class(**kwargs)
+
+    def get_sparse_fields(self):
+        value = self.request.args.get("fields")
+        if value:
+            names = tuple(value.split(","))
+            allowed = self.schema_class().fields
+            for name in names:
+                if name not in allowed or allowed[name].load_only:
+                    raise InvalidQueryArgument("fields", context=name)
+            self.sparse_fields = names
+        return self.sparse_fields
+
+    def get_read_columns(self):
+        """
+        Returns the model columns needed to dump the schema, in table order,
+        or None when all of them are needed.
+        """
+        return schema_columns(self.get_model().__table__, self.get_schema())
 
 
 class ModelMixin(object):
+    """
+    The `read_engine` selects how GET requests read the model. With
+    `READ_ENGINE_CORE` the same filters are run as a SQLAlchemy Core SELECT
+    and the schema dumps plain rows (see `base.rows`) instead of model
+    instances, so the session does not track (or even see) what was read.
+    With `READ_ENGINE_ASYNCPG` that SELECT runs on the asyncpg pool (see
+    `base.async_db`) instead.
+
+    What writes need to know about the model (foreign keys, audit columns)
+    is read from its `model_plan`, built when the routes are set up.
+    """
+    read_engine = READ_ENGINE_ORM
+    model_plan = None
+
     def get_model(self):
         return self.model
 
-    def get_item(self):
-        return self.get_model().query.filter(*self.get_url_parts_filters()).one()
+    def get_item(self, columns=None):
+        query = self.get_model().query
+        if columns is not None:
+            query = query.options(load_only(*[c.key for c in columns]))
+        return query.filter(*self.get_url_parts_filters()).one()
 
-    def has_related(self):
+    def get_read_statement(self, filters, columns=None):
+        if columns is None:
+            columns = self.get_model().__table__.columns
+        statement = select(columns)
+        if filters:
+            statement = statement.where(and_(*filters))
+        return statement
+
+    def fetch_rows(self, statement):
+        """
+        Runs a SELECT statement on the connection of the request session and
+        returns a list of row objects.
+        """
+        result = db.session.execute(statement)
+        return make_rows(result.keys(), result.fetchall())
+
+    def get_one_row(self, rows):
+        if not rows:
+            raise NoResultFound("No row was found for one()")
+        if len(rows) > 1:
+            raise MultipleResultsFound("Multiple rows were found for one()")
+        return rows[0]
+
+    def get_row(self, columns=None):
+        return self.get_one_row(self.fetch_rows(
+            self.get_read_statement(self.get_url_parts_filters(), columns).limit(2)
+        ))
+
+    async def async_get_item(self, columns=None):
+        return self.get_one_row(await async_db.fetch(
+            self.get_read_statement(self.get_url_parts_filters(), columns).limit(2)
+        ))
+
+    @classmethod
+    def prepare_model_plan(cls):
+        """
+        Builds the plan of the model of this controller (see
+        `base.model_plan`), called when the routes are set up. Raises
+        ValueError for `allowed_filters` or `indexed_filters` that are not
+        columns of the model.
+        """
+        model = getattr(cls, "model", None)
+        if model is not None:
+            cls.model_plan = model_plan(model)
+            columns = model.__table__.columns
+            filters = list(getattr(cls, "allowed_filters", ())) + list(getattr(cls, "indexed_filters", ()))
+            for name in filters:
+                if name not in columns:
+                    raise ValueError("%s filters on %s, which is not a column of %s" % (
+                        cls.__name__, name, model.__name__
+                    ))
+
+    def get_model_plan(self):
         m = self.get_model()
-        fks = [c for c in m.__table__.columns.values() if c.foreign_keys]
-        return True if len(fks) else False
+        plan = self.model_plan
+        if plan is None or plan.model is not m:
+            plan = model_plan(m)
+        return plan
+
+    def has_related(self):
+        return self.get_model_plan().has_foreign_keys
+
+    def invalidate_cached_responses(self, related_fields=None):
+        """
+        Drops the cached responses (see `ResponseCacheMixin`) of the model
+        and of the related models that were saved with `self.instance`.
+        """
+        tables = {self.get_model().__table__.name}
+        for name in related_fields or ():
+            related = getattr(self.instance, name, None)
+            if hasattr(related, "__table__"):
+                tables.add(related.__table__.name)
+        response_cache.invalidate(*tables)
+
+    def get_dependent_tables(self):
+        """
+        Returns the names of the tables with foreign keys to the model, whose
+        rows the database may delete or update along with it.
+        """
+        name = self.get_model().__table__.name
+        return [
+            table.name for table in Base.metadata.tables.values()
+            if any(fk.target_fullname.split(".")[0] == name for fk in table.foreign_keys)
+        ]
+
+    def save_related(self, related_fields, instances=None):
+        """
+        Saves the related models in `related_fields` of the instances
+        (`self.instance` by default) together and sets the foreign keys of
+        the instances to them.
+        """
+        if instances is None:
+            instances = [self.instance]
+        saved = []
+        for instance in instances:
+            for related in self.get_model_plan().related_fields:
+                if related.name in related_fields:
+                    fk_instance = getattr(instance, related.name, None)
+                    if fk_instance:
+                        if model_plan(type(fk_instance)).has_created_from and self.request.ip:
+                            fk_instance.created_from = self.request.ip
+                        saved.append((instance, related, fk_instance))
+        if not saved:
+            return
+        # The INSERT (or UPDATE) queries are sent to the database in batches,
+        # but the session is not committed now. It is committed by the
+        # create_instance or update_instance method after the parent is
+        # also added to the session.
+        save_batched(db.session, [fk_instance for _, _, fk_instance in saved])
+        for instance, related, fk_instance in saved:
+            setattr(instance, related.column, getattr(fk_instance, related.target))
+
+
+class IncludeMixin(object):
+    """
+    Clients can have related objects expanded in the items of the response
+    with `?include=<name>,<name>`, for the relations in `includes` (a dict
+    of names to `base.includes.Include`). The related rows of the whole
+    response are read with one query per relation, not one per item.
+    """
+    includes = {}
+    included = None
+
+    def get_included(self):
+        value = self.request.args.get("include")
+        if value:
+            names = tuple(value.split(","))
+            for name in names:
+                if name not in self.includes:
+                    raise InvalidQueryArgument("include", context=name)
+            self.included = names
+        return self.included
+
+    def get_read_columns(self):
+        columns = super().get_read_columns()
+        if columns is None or not self.included:
+            return columns
+        # The keys of the related rows are read with the items
+        model = self.get_model()
+        names = set(c.name for c in columns)
+        for name in self.included:
+            names.add(self.includes[name].get_relation(model, name).key_column.name)
+        return [c for c in model.__table__.columns if c.name in names]
+
+    def get_cache_tables(self):
+        tables = super().get_cache_tables()
+        value = self.request.args.get("include")
+        if not value:
+            return tables
+        # Responses change with the related tables too
+        model = self.get_model()
+        return tables + tuple(
+            table_name
+            for name in value.split(",") if name in self.includes
+            for table_name in self.includes[name].get_table_names(model, name)
+        )
+
+    def get_include_statements(self, items):
+        model = self.get_model()
+        statements = []
+        for name in self.included or ():
+            include = self.includes[name]
+            keys = include.get_keys(model, name, items)
+            statements.append((name, include.get_statement(model, name, keys) if keys else None))
+        return statements
+
+    def attach_include(self, name, items, data, rows):
+        self.includes[name].attach(self.get_model(), name, items, data, rows)
 
+    def dump_items(self, items, many=False):
+        """
+        Dumps an item (or a list of them with `many`) and the related
+        objects that were asked for.
+        """
+        data = self.get_schema().dump(items, many=many).data
+        if self.included:
+            items_list, data_list = (items, data) if many else ([items], [data])
+            for name, statement in self.get_include_statements(items_list):
+                rows = self.fetch_rows(statement) if statement is not None else []
+                self.attach_include(name, items_list, data_list, rows)
+        return data
+
+    async def async_dump_items(self, items, many=False):
+        data = self.get_schema().dump(items, many=many).data
+        if self.included:
+            items_list, data_list = (items, data) if many else ([items], [data])
+            for name, statement in self.get_include_statements(items_list):
+                rows = await async_db.fetch(statement) if statement is not None else []
+                self.attach_include(name, items_list, data_list, rows)
+        return data
+
+
+class ResponseCacheMixin(object):
+    """
+    If `cache_responses` is True, successful GET responses are cached in
+    `response_cache` (see `base.cache`) and served from there until the
+    model is written by a `CreateMixin` or `UpdateMixin` controller.
+
+    Responses are cached per route, URL parts and query string, and per user
+    for controllers that `filter_by_creator`. Controllers whose responses
+    depend on anything else should add it in `get_cache_key`, and the
+    tables they read besides the model in `get_cache_tables`.
+    """
+    cache_responses = False
+    response_cache = response_cache
+
+    def get_cache_key(self):
+        user_id = None
+        if getattr(self, "filter_by_creator", False) and self.request.user:
+            user_id = self.request.user.id
+        return (
+            self.request.path,
+            tuple(sorted(self.kwargs.items())),
+            self.request.query_string,
+            user_id
+        )
+
+    def get_cache_tables(self):
+        return (self.get_model().__table__.name,)
+
+    def make_cached_response(self, cached):
+        if cached is None:
+            return None
+        return HTTPResponse(
+            status=cached.status,
+            headers=dict(cached.headers),
+            content_type=cached.content_type,
+            body_bytes=cached.body
+        )
+
+    def make_cache_entry(self, key, resp):
+        # Streamed responses and errors are not cached
+        if key is not None and type(resp) is HTTPResponse and resp.status == 200:
+            return CachedResponse(resp.status, dict(resp.headers), resp.content_type, resp.body)
+        return None
+
+    def get_cached_response(self, generations, etag=None):
+        """
+        Returns the key to cache the response of this request under (None if
+        it is not cached) and the cached response, or None. `generations`
+        are those of the `get_cache_tables`.
+
+        When the ETag of the response is known it is part of the key, so
+        writes that did not go through the controllers are seen too.
+        """
+        if not self.cache_responses:
+            return None, None
+        key, cached = self.response_cache.get(
+            self.get_cache_tables(),
+            generations,
+            self.get_cache_key() + (etag,)
+        )
+        return key, self.make_cached_response(cached)
+
+    async def async_get_cached_response(self, generations, etag=None):
+        if not self.cache_responses:
+            return None, None
+        key, cached = await self.response_cache.async_get(
+            self.get_cache_tables(),
+            generations,
+            self.get_cache_key() + (etag,)
+        )
+        return key, self.make_cached_response(cached)
+
+    def cache_response(self, key, resp):
+        entry = self.make_cache_entry(key, resp)
+        if entry is not None:
+            self.response_cache.set(key, entry)
+        return resp
+
+    async def async_cache_response(self, key, resp):
+        entry = self.make_cache_entry(key, resp)
+        if entry is not None:
+            await self.response_cache.async_set(key, entry)
+        return resp
 
-class ListMixin(QueryFilter, SerializerMixin, ModelMixin):
+
+class ConditionalGetMixin(ResponseCacheMixin):
+    """
+    If `use_etags` is True, successful GET responses carry a strong ETag and
+    requests with a matching `If-None-Match` header get an empty 304
+    response, without the rows being loaded or serialized.
+
+    The ETag is computed from a cheap probe query (`get_etag_statement`)
+    that reads what changes when the rows of the response change: their
+    count and largest primary key for lists, and the largest value of the
+    `change_columns` the model has (an update time or a row version).
+    Updates of models without such columns are caught by the generations of
+    the tables in the response cache, which every write committed through
+    `CreateMixin` or `UpdateMixin` bumps (in all processes only with the
+    memcache tier, see `base.cache`).
+    """
+    use_etags = False
+    change_columns = ("updated_at", "version")
+
+    def get_change_columns(self):
+        table = self.get_model().__table__
+        return [table.columns[name] for name in self.change_columns if name in table.columns]
+
+    def get_etag_statement(self):
+        """
+        Returns the probe query of the ETag, or None if the responses of the
+        controller have no ETag. Overridden by `ListMixin` and `ViewMixin`.
+        """
+        return None
+
+    def make_response_etag(self, generations, rows):
+        if not rows:
+            return None
+        return make_etag(self.get_cache_key(), generations, [tuple(row) for row in rows])
+
+    def get_etag(self, generations):
+        if not self.use_etags:
+            return None
+        try:
+            statement = self.get_etag_statement()
+        except InvalidQueryArgument:
+            return None
+        if statement is None:
+            return None
+        return self.make_response_etag(generations, self.fetch_rows(statement))
+
+    async def async_get_etag(self, generations):
+        if not self.use_etags:
+            return None
+        try:
+            statement = self.get_etag_statement()
+        except InvalidQueryArgument:
+            return None
+        if statement is None:
+            return None
+        return self.make_response_etag(generations, await async_db.fetch(statement))
+
+    def get_not_modified(self, etag):
+        if etag is not None and etag_matches(etag, self.request.headers.get("if-none-match")):
+            return HTTPResponse(status=304, headers={"ETag": etag})
+        return None
+
+    def set_etag(self, resp, etag):
+        if etag is not None and type(resp) is HTTPResponse and resp.status == 200:
+            resp.headers["ETag"] = etag
+        return resp
+
+    def get_read_response(self, build_response):
+        """
+        Returns the response built by `build_response`, or a cached or 304
+        response when possible. The generations of the tables are read once
+        for both.
+        """
+        generations = None
+        if self.use_etags or self.cache_responses:
+            generations = self.response_cache.get_generations(self.get_cache_tables())
+        etag = self.get_etag(generations)
+        resp = self.get_not_modified(etag)
+        if resp is not None:
+            return resp
+        key, resp = self.get_cached_response(generations, etag)
+        if resp is None:
+            resp = self.cache_response(key, build_response())
+        return self.set_etag(resp, etag)
+
+    async def async_get_read_response(self, build_response):
+        generations = None
+        if self.use_etags or self.cache_responses:
+            generations = await self.response_cache.async_get_generations(self.get_cache_tables())
+        etag = await self.async_get_etag(generations)
+        resp = self.get_not_modified(etag)
+        if resp is not None:
+            return resp
+        key, resp = await self.async_get_cached_response(generations, etag)
+        if resp is None:
+            resp = await self.async_cache_response(key, await build_response())
+        return self.set_etag(resp, etag)
+
+
+class ListMixin(QueryFilter, IncludeMixin, SerializerMixin, ModelMixin, ConditionalGetMixin):
     """
     This mixin is used to get a list of items for a given model.
+
+    Lists are paginated with keyset pagination on the `sort_column` (and the
+    primary key to break ties), or only the primary key by default.
+    Clients ask for at most `max_page_size` items with `?limit=` and move
+    between pages with the opaque cursors returned in the `X-Next-Cursor`
+    and `X-Prev-Cursor` headers, passed back as `?after=` or `?before=`.
+    The sort column should be indexed together with the primary key.
+
+    If `allow_streaming` is True, clients can instead ask for the whole list
+    (after the `?after=` cursor if any) with `?stream=ndjson` (or an
+    `Accept: application/x-ndjson` header) or `?stream=json`. Rows are then
+    read from a server side cursor and written in batches of
+    `stream_batch_size`, as newline delimited JSON or as one JSON array.
     """
+    page_size = 50
+    max_page_size = 200
+    sort_column = None
+    page = None
+    allow_streaming = False
+    stream_batch_size = 500
+
+    def get_sort_columns(self):
+        m = self.get_model()
+        # Model attributes like `Question.text` are descriptors, read on the
+        # controller they would bind to it
+        sort_column = getattr_static(self, "sort_column")
+        if sort_column is None or sort_column.key == m.id.key:
+            return [m.id]
+        return [sort_column, m.id]
+
+    def get_page(self):
+        if self.page is None:
+            self.page = KeysetPage.from_args(
+                self.request.args,
+                self.get_sort_columns(),
+                self.page_size,
+                self.max_page_size
+            )
+        return self.page
+
+    def get_read_columns(self):
+        columns = super().get_read_columns()
+        if columns is None:
+            return None
+        # The cursors are made of the sort columns
+        table = self.get_model().__table__
+        names = set(c.name for c in columns)
+        names.update(c.key for c in self.get_sort_columns())
+        return [c for c in table.columns if c.name in names]
+
+    def get_list_query(self, query, columns=None):
+        if columns is not None:
+            query = query.options(load_only(*[c.key for c in columns]))
+        return query
+
+    def get_list_statement(self):
+        page = self.get_page()
+        statement = self.get_read_statement(
+            self.get_all_filters() + page.criteria,
+            self.get_read_columns()
+        )
+        return statement.order_by(*page.order_by).limit(page.fetch_limit)
 
     def get_list(self):
-        if hasattr(self, "get_url_parts_filters"):
-            return self.get_model().query.filter(*self.get_url_parts_filters()).all()
+        page = self.get_page()
+        if self.read_engine == READ_ENGINE_CORE:
+            return page.finish(self.fetch_rows(self.get_list_statement()))
+
+        query = self.get_list_query(self.get_model().query, self.get_read_columns())
+        query = query.filter(*self.get_all_filters())
+        query = query.filter(*page.criteria).order_by(*page.order_by)
+        return page.finish(query.limit(page.fetch_limit).all())
+
+    async def async_get_list(self):
+        return self.get_page().finish(await async_db.fetch(self.get_list_statement()))
+
+    def get_stream_format(self):
+        if not self.allow_streaming:
+            return None
+        stream_format = self.request.args.get("stream")
+        if stream_format is None:
+            if self.request.headers.get("accept") != "application/x-ndjson":
+                return None
+            stream_format = STREAM_NDJSON
+        elif stream_format not in (STREAM_NDJSON, STREAM_JSON):
+            raise InvalidQueryArgument("stream")
+        if self.included:
+            raise InvalidQueryArgument("include", context="not with streams")
+        return stream_format
+
+    async def run_stream_call(self, func, *args):
+        # Streams are read after the handler returned, their blocking calls
+        # go to the database executor here
+        if getattr(self, "use_db_executor", False):
+            return await executor.run(func, *args)
+        return func(*args)
+
+    def execute_stream(self, statement):
+        connection = db.engine.connect().execution_options(stream_results=True)
+        try:
+            return connection, connection.execute(statement)
+        except BaseException:
+            connection.close()
+            raise
+
+    def fetch_stream_batch(self, session, rows):
+        batch = list(itertools.islice(rows, self.stream_batch_size))
+        # Rows already sent are not needed in the session any more
+        session.expunge_all()
+        return batch
+
+    async def iter_stream_batches(self, filters, order_by, columns):
+        if self.read_engine == READ_ENGINE_ASYNCPG:
+            statement = self.get_read_statement(filters, columns).order_by(*order_by)
+            async for batch in async_db.iterate(statement, self.stream_batch_size):
+                yield batch
+            return
+
+        if self.read_engine == READ_ENGINE_CORE:
+            statement = self.get_read_statement(filters, columns).order_by(*order_by)
+            connection, result = await self.run_stream_call(self.execute_stream, statement)
+            try:
+                names = result.keys()
+                while True:
+                    records = await self.run_stream_call(result.fetchmany, self.stream_batch_size)
+                    if not records:
+                        break
+                    yield make_rows(names, records)
+            finally:
+                connection.close()
+            return
+
+        # The request session is closed before a streamed response is
+        # written, so the rows are read with a session of our own.
+        session = db.create_session()
+        try:
+            query = self.get_list_query(session.query(self.get_model()), columns)
+            query = query.filter(*filters).order_by(*order_by)
+            # The query runs when the iterator is made
+            rows = await self.run_stream_call(iter, query.yield_per(self.stream_batch_size))
+            while True:
+                batch = await self.run_stream_call(self.fetch_stream_batch, session, rows)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            session.close()
+
+    async def write_chunk(self, stream_response, chunk):
+        # Newer Sanic versions wait here for the client to drain
+        written = stream_response.write(chunk)
+        if isawaitable(written):
+            await written
+
+    async def write_stream(self, filters, order_by, columns, stream_format, stream_response):
+        schema = self.get_schema()
+        first = True
+        if stream_format == STREAM_JSON:
+            await self.write_chunk(stream_response, "[")
+
+        async for batch in self.iter_stream_batches(filters, order_by, columns):
+            items = schema.dump(batch, many=True).data
+            if stream_format == STREAM_NDJSON:
+                chunk = "".join(json_dumps(item) + "\n" for item in items)
+            else:
+                chunk = ",".join(json_dumps(item) for item in items)
+                if not first:
+                    chunk = "," + chunk
+            first = False
+            await self.write_chunk(stream_response, chunk)
+
+        if stream_format == STREAM_JSON:
+            await self.write_chunk(stream_response, "]")
+
+    def stream_list(self, stream_format):
+        page = self.get_page()
+        # Filters are built now, while the request (and its user) is live
+        filters = self.get_all_filters() + page.criteria
+        if stream_format == STREAM_NDJSON:
+            content_type = "application/x-ndjson"
         else:
-            return self.get_model().query.all()
+            content_type = "application/json"
+        return response.stream(
+            partial(self.write_stream, filters, page.order_by, self.get_read_columns(), stream_format),
+            content_type=content_type
+        )
 
-    def handle_get(self, *args, **kwargs):
+    def get_list_response(self):
+        try:
+            self.get_sparse_fields()
+            self.get_included()
+            stream_format = self.get_stream_format()
+            if stream_format:
+                return self.stream_list(stream_format)
+            items = self.get_list()
+        except InvalidQueryArgument as error:
+            return self.handle_invalid_query_argument(error)
         return response.json(
-            self.get_schema().dump(self.get_list(), many=True).data
+            self.dump_items(items, many=True),
+            headers=self.page.headers()
         )
 
+    async def async_get_list_response(self):
+        try:
+            self.get_sparse_fields()
+            self.get_included()
+            stream_format = self.get_stream_format()
+            if stream_format:
+                return self.stream_list(stream_format)
+            items = await self.async_get_list()
+        except InvalidQueryArgument as error:
+            return self.handle_invalid_query_argument(error)
+        return response.json(
+            await self.async_dump_items(items, many=True),
+            headers=self.page.headers()
+        )
+
+    def get_etag_statement(self):
+        table = self.get_model().__table__
+        columns = [func.count()] + [func.max(c) for c in table.primary_key.columns]
+        columns += [func.max(c) for c in self.get_change_columns()]
+        # Named so that rows read by asyncpg get distinct field names
+        columns = [column.label("etag_%d" % index) for index, column in enumerate(columns)]
+        statement = select(columns).select_from(table)
+        filters = self.get_all_filters()
+        if filters:
+            statement = statement.where(and_(*filters))
+        return statement
+
+    def handle_get(self, *args, **kwargs):
+        return self.get_read_response(self.get_list_response)
+
+    async def handle_get_async(self, *args, **kwargs):
+        return await self.async_get_read_response(self.async_get_list_response)
+
 
-class ViewMixin(QueryFilter, SerializerMixin, ModelMixin):
+class ViewMixin(QueryFilter, IncludeMixin, SerializerMixin, ModelMixin, ConditionalGetMixin):
     """
     This mixin is used to get a single item for a given model.
 
     When we are reading an item for any model, we require some filters.
     """
 
-    def handle_get(self, *args, **kwargs):
+    def get_item_response(self):
         try:
+            self.get_sparse_fields()
+            self.get_included()
+            if self.read_engine == READ_ENGINE_CORE:
+                item = self.get_row(self.get_read_columns())
+            else:
+                item = self.get_item(self.get_read_columns())
+            return response.json(self.dump_items(item))
+        except InvalidQueryArgument as error:
+            return self.handle_invalid_query_argument(error)
+        except NoResultFound:
+            errors = Error.generate_error(type=ErrorType.DATA_NOT_FOUND)
             return response.json(
-                self.get_schema().dump(self.get_item()).data
+                errors,
+                status=404
             )
+
+    async def async_get_item_response(self):
+        try:
+            self.get_sparse_fields()
+            self.get_included()
+            item = await self.async_get_item(self.get_read_columns())
+            return response.json(await self.async_dump_items(item))
+        except InvalidQueryArgument as error:
+            return self.handle_invalid_query_argument(error)
         except NoResultFound:
             errors = Error.generate_error(type=ErrorType.DATA_NOT_FOUND)
             return response.json(
@@ -112,16 +883,36 @@ class ViewMixin(QueryFilter, SerializerMixin, ModelMixin):
                 status=404
             )
 
+    def get_etag_statement(self):
+        table = self.get_model().__table__
+        columns = list(table.primary_key.columns) + self.get_change_columns()
+        return self.get_read_statement(self.get_url_parts_filters(), columns).limit(2)
+
+    def handle_get(self, *args, **kwargs):
+        return self.get_read_response(self.get_item_response)
+
+    async def handle_get_async(self, *args, **kwargs):
+        return await self.async_get_read_response(self.async_get_item_response)
+
 
 class CreateMixin(SerializerMixin, ModelMixin):
+    """
+    If `allow_bulk_create` is True, clients can also POST a JSON array of
+    at most `max_bulk_create` items. All of them are validated first and,
+    if they are all valid, created in one transaction with batched INSERTs.
+    Errors of items are reported with their index in the field name, like
+    `3.text`.
+    """
     instance = None
     save_creator = True
     related_fields_to_create = None
+    allow_bulk_create = False
+    max_bulk_create = 5000
 
     def get_insert_defaults(self):
         return {}
 
-    def create_related(self):
+    def create_related(self, instances=None):
         """
         Saves related models of the model that this request is handling.
         Related models should be specified in the schema instance.
@@ -129,33 +920,15 @@ class CreateMixin(SerializerMixin, ModelMixin):
 
         Foreign key names are assumed to be ending in "_id" or "_fk"
         """
-        m = self.get_model()
-        fks = [c for c in m.__table__.columns.values() if c.foreign_keys]
-        for c in fks:
-            fk = list(c.foreign_keys)[0]
-            if c.name[-3:] == "_id" or c.name[-3:] == "_fk":
-                name = c.name[:-3]
-                if (name in self.related_fields_to_create and
-                        hasattr(self.instance, name) and
-                        getattr(self.instance, name, None)):
-                    fk_instance = getattr(self.instance, name)
-                    if(hasattr(fk_instance, "created_from") and self.request.ip):
-                        fk_instance.created_from = self.request.ip
-                    fk_instance.save(commit=False)
-                    # When we use flush, the INSERT query is sent to the
-                    # database, but session is not committed now.
-                    # The session is committed by the create_instance method
-                    # after the parent is also added to session.
-                    db.session.flush()
-                    fk_id = getattr(fk_instance, fk.column.name)
-                    setattr(self.instance, c.name, fk_id)
+        self.save_related(self.related_fields_to_create, instances)
 
-    def create_instance(self):
+    def prepare_instance(self):
         instance = self.instance
-        if(hasattr(instance, "created_from") and self.request.ip):
+        plan = self.get_model_plan()
+        if plan.has_created_from and self.request.ip:
             instance.created_from = self.request.ip
         if (self.save_creator and
-                hasattr(instance, "created_by_id") and
+                plan.has_created_by_id and
                 instance.created_by_id is None and self.request.user):
             instance.created_by_id = self.request.user.id
         for k, v in self.get_insert_defaults().items():
@@ -163,18 +936,36 @@ class CreateMixin(SerializerMixin, ModelMixin):
         if hasattr(self, "pre_create"):
             self.pre_create()
 
+    def create_instance(self):
+        return self.create_instances([self.instance])
+
+    def create_instances(self, instances):
+        """
+        Creates the instances in one transaction, new rows are inserted in
+        batches (see `base.unit_of_work`). The hooks are called for each
+        instance, with `self.instance` set to it.
+        """
+        for instance in instances:
+            self.instance = instance
+            self.prepare_instance()
+
         if self.related_fields_to_create and self.has_related():
-            self.create_related()
+            self.create_related(instances)
 
         try:
-            instance.save(commit=False)
+            save_batched(db.session, instances)
             if hasattr(self, "pre_create_commit"):
                 db.session.flush()
-                self.pre_create_commit()
+                for instance in instances:
+                    self.instance = instance
+                    self.pre_create_commit()
 
             db.session.commit()
+            self.invalidate_cached_responses(self.related_fields_to_create)
             if hasattr(self, "post_create"):
-                self.post_create()
+                for instance in instances:
+                    self.instance = instance
+                    self.post_create()
             return True, {}
         except AttributeError as error:
             db.session.rollback()
@@ -188,7 +979,56 @@ class CreateMixin(SerializerMixin, ModelMixin):
         except NoResultFound:
             return False, Error.generate_error(type=ErrorType.DATA_NOT_FOUND)
 
+    def handle_bulk_post(self):
+        items = self.request.json
+        context = None
+        if not items or len(items) > self.max_bulk_create:
+            context = "1 to %d items" % self.max_bulk_create
+        elif not all(isinstance(item, dict) for item in items):
+            context = "items must be objects"
+        if context is not None:
+            errors = Error.generate_error(
+                data={
+                    "error_code": Error.INVALID_VALUE,
+                    "field": None,
+                    "context": context
+                },
+                type=ErrorType.CUSTOM_ERRORS
+            )
+            return response.json(errors, status=400)
+
+        schema = self.get_schema()
+        schema_instance = schema.load(items, many=True)
+        if schema_instance.errors:
+            errors = Error.generate_error(
+                data=schema_instance.errors,
+                type=ErrorType.SCHEMA_ERROR
+            )
+            return response.json(errors, status=400)
+
+        # The created rows are dumped as they were written, instead of being
+        # loaded again one by one after the commit. The session may be shared
+        # with other requests of a batch, its setting is restored.
+        session = db.session
+        expire_on_commit = session.expire_on_commit
+        session.expire_on_commit = False
+        instances = schema_instance.data
+        try:
+            status, errors = self.create_instances(instances)
+        finally:
+            session.expire_on_commit = expire_on_commit
+        if status:
+            return response.json(
+                schema.dump(instances, many=True).data,
+                status=201
+            )
+        else:
+            return response.json(errors, status=400)
+
     def handle_post(self, *args, **kwargs):
+        if self.allow_bulk_create and isinstance(self.request.json, list):
+            return self.handle_bulk_post()
+
         schema = self.get_schema()
         schema_instance = schema.load(self.request.json)
         print(self.request.json)
@@ -213,9 +1053,27 @@ class CreateMixin(SerializerMixin, ModelMixin):
 
 
 class UpdateMixin(QueryFilter, SerializerMixin, ModelMixin):
+    """
+    PUT loads the item, validates the whole request into it and saves it.
+
+    PATCH validates only the fields in the request and writes them with a
+    single `UPDATE ... WHERE <url parts> RETURNING <columns>`, without
+    loading the row first. Only fields that map to columns of the model can
+    be patched, and the `pre_update`/`post_update` hooks (which work on
+    model instances) are not run. Nothing is written if the URL parts do
+    not match exactly one row, and anonymous requests get a 401 with
+    `filter_by_creator`.
+
+    If `version_column` is set (an integer column of the model), PATCH
+    requests must send the version of the row they read in that field. The
+    UPDATE only matches the row at that version and increments it, so of
+    two clients that read the same version only the first can write, the
+    other gets a 409. No lock is held while the request is handled.
+    """
     instance = None
     related_fields_to_update = None
     save_creator = True
+    version_column = None
 
     def get_update_defaults(self):
         return {}
@@ -231,36 +1089,14 @@ class UpdateMixin(QueryFilter, SerializerMixin, ModelMixin):
 
         Foreign key names are assumed to be ending in "_id" or "_fk"
         """
-        m = self.get_model()
-        fks = [c for c in m.__table__.columns.values() if c.foreign_keys]
-        for c in fks:
-            fk = list(c.foreign_keys)[0]
-            if c.name[-3:] == "_id" or c.name[-3:] == "_fk":
-                name = c.name[:-3]
-                if (name in self.related_fields_to_update and
-                        hasattr(self.instance, name) and
-                        getattr(self.instance, name, None)):
-                    # This instance may have an PK (id) in case the related
-                    # model already existed.
-                    fk_instance = getattr(self.instance, name)
-                    if(hasattr(fk_instance, "created_from") and self.request.ip):
-                        fk_instance.created_from = self.request.ip
-                    # SQLAlchemy will generate INSERT or UPDATE depending
-                    # on the related models existance.
-                    fk_instance.save(commit=False)
-                    # The following applies only for new related models.
-                    # When we use flush, the INSERT query is sent to the
-                    # database, but session is not committed now.
-                    # The session is committed by the create_instance method
-                    # after the parent is also added to session.
-                    db.session.flush()
-                    fk_id = getattr(fk_instance, fk.column.name)
-                    setattr(self.instance, c.name, fk_id)
+        # Related models that already existed are updated, new ones are
+        # inserted (see `base.unit_of_work`).
+        self.save_related(self.related_fields_to_update)
 
     def update_instance(self):
         instance = self.instance
         if (self.save_creator and
-                hasattr(instance, "updated_by_id") and
+                self.get_model_plan().has_updated_by_id and
                 instance.updated_by_id is None and self.request.user):
             instance.updated_by_id = self.request.user.id
         for k, v in self.get_update_defaults().items():
@@ -276,6 +1112,7 @@ class UpdateMixin(QueryFilter, SerializerMixin, ModelMixin):
             instance.save(commit=False)
 
             db.session.commit()
+            self.invalidate_cached_responses(self.related_fields_to_update)
             if hasattr(self, "post_update"):
                 self.post_update()
             return True, {}
@@ -296,11 +1133,16 @@ class UpdateMixin(QueryFilter, SerializerMixin, ModelMixin):
             existing = self.get_item()
         except NoResultFound:
             return response.json(Error.generate_error(type=ErrorType.DATA_NOT_FOUND), status=404)
-        if hasattr(self, "pre_update"):
-            self.pre_update(existing=existing, schema=self.get_schema().load(self.request.json))
-
+        # The request is validated once, its result is made into the instance
+        # given to `pre_update` and into the update of the existing instance.
         schema = self.get_schema(instance=existing)
-        schema_instance = schema.load(self.request.json)
+        loaded = schema.load(self.request.json, postprocess=False)
+        if hasattr(self, "pre_update"):
+            self.pre_update(
+                existing=existing,
+                schema=self.get_schema().postprocess_load(loaded, self.request.json)
+            )
+        schema_instance = schema.postprocess_load(loaded, self.request.json)
 
         if not schema_instance.errors:
             self.instance = schema_instance.data
@@ -319,14 +1161,212 @@ class UpdateMixin(QueryFilter, SerializerMixin, ModelMixin):
             )
             return response.json(errors, status=400)
 
+    def get_patch_values(self, data):
+        """
+        Returns the column values to set for the loaded fields of a PATCH
+        request, raises InvalidQueryArgument for fields that are not
+        columns of the model.
+        """
+        columns = self.get_model().__table__.columns
+        values = {}
+        for key, value in data.items():
+            if key == self.version_column:
+                continue
+            if key not in columns:
+                raise InvalidQueryArgument(key, context="cannot be patched")
+            values[key] = value
+        if not values:
+            raise InvalidQueryArgument(None, context="no field to update")
+        if (self.save_creator and
+                self.get_model_plan().has_updated_by_id and
+                "updated_by_id" not in values and self.request.user):
+            values["updated_by_id"] = self.request.user.id
+        values.update(self.get_update_defaults())
+        return values
+
+    def patch_row(self, filters, values, read_filters):
+        """
+        Updates the row matched by the filters and returns it as a row object
+        (see `base.rows`). Nothing is written if the filters do not match
+        exactly one row.
+
+        On databases without RETURNING, the row is read back by the
+        `read_filters` after the UPDATE.
+        """
+        table = self.get_model().__table__
+        statement = table.update().where(and_(*filters)).values(values)
+        if db.session.get_bind().dialect.implicit_returning:
+            rows = self.fetch_rows(statement.returning(*(self.get_read_columns() or table.columns)))
+        elif db.session.execute(statement).rowcount:
+            rows = self.fetch_rows(self.get_read_statement(read_filters, self.get_read_columns()))
+        else:
+            rows = []
+        if len(rows) != 1:
+            db.session.rollback()
+        return self.get_one_row(rows)
+
+    def get_row_exists(self, filters):
+        table = self.get_model().__table__
+        statement = self.get_read_statement(filters, list(table.primary_key.columns)).limit(1)
+        return bool(self.fetch_rows(statement))
+
+    def handle_patch(self, *args, **kwargs):
+        resp = self.get_unauthenticated_response()
+        if resp is not None:
+            return resp
+        json = self.request.json
+        if not isinstance(json, dict):
+            errors = Error.generate_error(
+                data={
+                    "error_code": Error.INVALID_INPUT_TYPE,
+                    "field": None,
+                    "context": None
+                },
+                type=ErrorType.CUSTOM_ERRORS
+            )
+            return response.json(errors, status=400)
+        schema = self.get_schema()
+        loaded = schema.load(json, partial=True, postprocess=False)
+        if loaded.errors:
+            errors = Error.generate_error(data=loaded.errors, type=ErrorType.SCHEMA_ERROR)
+            return response.json(errors, status=400)
+
+        try:
+            values = self.get_patch_values(loaded.data)
+            # The creator filter alone does not identify an item
+            url_filters = self.get_item_filters()
+            if not url_filters:
+                raise InvalidQueryArgument(None, context="a filter is required")
+        except InvalidQueryArgument as error:
+            return self.handle_invalid_query_argument(error)
+        url_filters += self.get_creator_filters()
+        filters = self.get_default_filters() + url_filters
+
+        if self.version_column:
+            version = json.get(self.version_column)
+            if type(version) is not int:
+                error_code = Error.INVALID_VALUE if version is not None else Error.MISSING_REQUIRED_FIELD
+                errors = Error.generate_error(
+                    data={
+                        "error_code": error_code,
+                        "field": self.version_column,
+                        "context": None
+                    },
+                    type=ErrorType.CUSTOM_ERRORS
+                )
+                return response.json(errors, status=400)
+            column = self.get_model().__table__.columns[self.version_column]
+            filters.append(column == version)
+            values[self.version_column] = column + 1
+
+        try:
+            row = self.patch_row(filters, values, url_filters)
+            db.session.commit()
+        except IntegrityError as i:
+            errors = Error.generate_error(data=i, type=ErrorType.DATABASE_WRITE_FAIL)
+            return response.json(errors, status=400)
+        except NoResultFound:
+            if self.version_column and self.get_row_exists(url_filters):
+                errors = Error.generate_error(
+                    data={
+                        "error_code": Error.VERSION_CONFLICT,
+                        "field": self.version_column,
+                        "context": None
+                    },
+                    type=ErrorType.CUSTOM_ERRORS
+                )
+                return response.json(errors, status=409)
+            return response.json(Error.generate_error(type=ErrorType.DATA_NOT_FOUND), status=404)
+        except MultipleResultsFound:
+            return response.json(self.get_multiple_items_error(), status=400)
+
+        self.invalidate_cached_responses()
+        return response.json(schema.dump(row).data, status=200)
+
 
 class DeleteMixin(QueryFilter, ModelMixin):
-    pass
+    """
+    Deletes the item matched by the URL parts (and the current user with
+    `filter_by_creator`, anonymous requests then get a 401) with a single
+    `DELETE ... WHERE`, without loading it first. Nothing is deleted if the
+    URL parts do not match exactly one row.
+
+    If `allow_bulk_delete` is True, the filters of the query string or of a
+    JSON body (see `allowed_filters`) also apply, so one request can delete
+    many rows. The creator filter does not count as a filter: a request
+    without any other filter never deletes all the rows of a user, or the
+    whole table.
+
+    Rows of other tables that reference the deleted rows are removed by the
+    database, their foreign keys should be `ondelete="CASCADE"`.
+    """
+    allow_bulk_delete = False
+
+    def get_delete_filters(self):
+        filters = self.get_item_filters()
+        if self.allow_bulk_delete:
+            filters += self.get_url_query_filters() + self.get_json_filters()
+        if not filters:
+            raise InvalidQueryArgument(None, context="a filter is required")
+        return self.get_default_filters() + filters + self.get_creator_filters()
+
+    def delete_rows(self, filters):
+        """
+        Deletes the rows matched by the filters and returns how many were.
+        Without `allow_bulk_delete`, nothing is deleted if they match more
+        than one row.
+        """
+        statement = self.get_model().__table__.delete().where(and_(*filters))
+        try:
+            count = db.session.execute(statement).rowcount
+            if count > 1 and not self.allow_bulk_delete:
+                db.session.rollback()
+                return False, self.get_multiple_items_error()
+            db.session.commit()
+        except IntegrityError as i:
+            return False, Error.generate_error(data=i, type=ErrorType.DATABASE_WRITE_FAIL)
+        response_cache.invalidate(self.get_model().__table__.name, *self.get_dependent_tables())
+        return True, count
+
+    def handle_delete(self, *args, **kwargs):
+        resp = self.get_unauthenticated_response()
+        if resp is not None:
+            return resp
+        try:
+            filters = self.get_delete_filters()
+        except InvalidQueryArgument as error:
+            return self.handle_invalid_query_argument(error)
+
+        status, result = self.delete_rows(filters)
+        if not status:
+            return response.json(result, status=400)
+        if not result:
+            return response.json(Error.generate_error(type=ErrorType.DATA_NOT_FOUND), status=404)
+        return response.json({"deleted": result})
 
 
 class BaseController(HTTPMethodView):
+    """
+    If `use_db_executor` is True, the `handle_*` methods of the controller
+    (which run blocking SQLAlchemy queries) are run on the bounded
+    database thread pool instead of the event loop.
+
+    GET requests of controllers with `read_engine = READ_ENGINE_ASYNCPG` are
+    handled by `handle_get_async` instead, directly on the event loop.
+
+    If `coalesce_requests` is True, identical GET requests (see
+    `get_coalesce_key`) that come in while one of them is being handled
+    wait for it and get a copy of its response (see `base.coalesce`).
+
+    The user of the request is only resolved (see `CustomRequest`) for
+    handlers that use it, see `needs_user`. GET handlers that read
+    `request.user` otherwise should set `uses_user`.
+    """
     request = None
     kwargs = None
+    use_db_executor = False
+    coalesce_requests = False
+    uses_user = False
     __request_initiated = False
 
     def init_request(self, request, *args, **kwargs):
@@ -334,12 +1374,86 @@ class BaseController(HTTPMethodView):
         self.kwargs = kwargs
         self.__request_initiated = True
 
+    def needs_user(self, handler):
+        return (
+            self.uses_user or
+            self.request.method != GET_REQUEST or
+            getattr(self, "filter_by_creator", False) or
+            getattr(handler, "requires_user", False)
+        )
+
+    async def prepare_user(self, handler):
+        # Handlers are synchronous, the user is resolved before they run
+        if hasattr(self.request, "resolve_user") and self.needs_user(handler):
+            await self.request.resolve_user()
+
+    async def run_handler(self, handler, *args, **kwargs):
+        await self.prepare_user(handler)
+        if not self.use_db_executor:
+            return handler(*args, **kwargs)
+
+        try:
+            return await executor.run(handler, *args, **kwargs)
+        except ExecutorBusy:
+            errors = Error.generate_error(
+                data={
+                    "error_code": Error.SERVER_BUSY,
+                    "field": None,
+                    "context": None
+                },
+                type=ErrorType.CUSTOM_ERRORS
+            )
+            return response.json(
+                errors,
+                status=503
+            )
+
+    def get_coalesce_key(self):
+        """
+        Requests with the same key get the same response: the same route
+        and URL parts, query string and session token, and the same headers
+        that the response depends on.
+        """
+        return (
+            self.request.path,
+            tuple(sorted(self.kwargs.items())),
+            self.request.query_string,
+            self.request.headers.get("authorization"),
+            self.request.headers.get("accept"),
+            self.request.headers.get("if-none-match")
+        )
+
     async def get(self, request, *args, **kwargs):
         if not self.__request_initiated:
             self.init_request(request, *args, **kwargs)
 
-        if hasattr(self, "handle_get"):
-            return self.handle_get(*args, **kwargs)
+        if not self.coalesce_requests:
+            return await self.dispatch_get(*args, **kwargs)
+
+        resp, shared = await single_flight.run(
+            type(self).__name__,
+            self.get_coalesce_key(),
+            partial(self.dispatch_get, *args, **kwargs)
+        )
+        if not shared:
+            return resp
+        if type(resp) is not HTTPResponse:
+            # Streamed responses can only be written once
+            return await self.dispatch_get(*args, **kwargs)
+        return HTTPResponse(
+            status=resp.status,
+            headers=dict(resp.headers),
+            content_type=resp.content_type,
+            body_bytes=resp.body
+        )
+
+    async def dispatch_get(self, *args, **kwargs):
+        if (getattr(self, "read_engine", READ_ENGINE_ORM) == READ_ENGINE_ASYNCPG and
+                hasattr(self, "handle_get_async")):
+            await self.prepare_user(self.handle_get_async)
+            return await self.handle_get_async(*args, **kwargs)
+        elif hasattr(self, "handle_get"):
+            return await self.run_handler(self.handle_get, *args, **kwargs)
         else:
             errors = Error.generate_error(data=GET_REQUEST, type=ErrorType.INVALID_METHOD)
             return response.json(
@@ -352,7 +1466,7 @@ class BaseController(HTTPMethodView):
             self.init_request(request, *args, **kwargs)
 
         if hasattr(self, "handle_post"):
-            return self.handle_post(*args, **kwargs)
+            return await self.run_handler(self.handle_post, *args, **kwargs)
         else:
             errors = Error.generate_error(data=POST_REQUEST, type=ErrorType.INVALID_METHOD)
             return response.json(
@@ -365,7 +1479,7 @@ class BaseController(HTTPMethodView):
             self.init_request(request, *args, **kwargs)
 
         if hasattr(self, "handle_put"):
-            return self.handle_put(*args, **kwargs)
+            return await self.run_handler(self.handle_put, *args, **kwargs)
         else:
             errors = Error.generate_error(data=PUT_REQUEST, type=ErrorType.INVALID_METHOD)
             return response.json(
@@ -373,12 +1487,25 @@ class BaseController(HTTPMethodView):
                 status=405
             )
 
+    async def patch(self, request, *args, **kwargs):
+        if not self.__request_initiated:
+            self.init_request(request, *args, **kwargs)
+
+        if hasattr(self, "handle_patch"):
+            return await self.run_handler(self.handle_patch, *args, **kwargs)
+        else:
+            errors = Error.generate_error(data=PATCH_REQUEST, type=ErrorType.INVALID_METHOD)
+            return response.json(
+                errors,
+                status=405
+            )
+
     async def delete(self, request, *args, **kwargs):
         if not self.__request_initiated:
             self.init_request(request, *args, **kwargs)
 
         if hasattr(self, "handle_delete"):
-            return self.handle_delete(*args, **kwargs)
+            return await self.run_handler(self.handle_delete, *args, **kwargs)
         else:
             errors = Error.generate_error(data=DELETE_REQUEST, type=ErrorType.INVALID_METHOD)
             return response.json(
@@ -1,4 +1,7 @@
+import contextvars
 import datetime
+import threading
+from contextlib import contextmanager
 from sqlalchemy import (
     Column, DateTime, Integer, create_engine
 )
@@ -17,6 +20,28 @@ class classproperty(object):
         return self.fget(owner_cls)
 
 
+# Key of the session registry for the request being handled in the current
+# task. It is None outside of requests (scripts, fixtures, migrations).
+_session_scope = contextvars.ContextVar("db_session_scope", default=None)
+
+# Connection that the sessions created in the current context are bound to,
+# see `DB.shared_transaction`. None binds them to the engine.
+_session_bind = contextvars.ContextVar("db_session_bind", default=None)
+
+
+def current_session_scope():
+    """
+    Returns the key under which the current session is registered.
+    Inside a request this is the request scope, so concurrent requests on the
+    same event loop thread never share a session. Outside of a request we
+    fall back to the thread, which is what `scoped_session` does by default.
+    """
+    scope = _session_scope.get()
+    if scope is None:
+        return threading.get_ident()
+    return scope
+
+
 class DB(metaclass=Singleton):
     __engine = None
     __scoped_session = None
@@ -42,17 +67,63 @@ class DB(metaclass=Singleton):
         if self.__scoped_session is None:
             Session = scoped_session(sessionmaker(
                 autocommit=False
-            ))
+            ), scopefunc=current_session_scope)
             Session.configure(bind=self.engine)
             self.__scoped_session = Session
+        bind = _session_bind.get()
+        if bind is not None and not self.__scoped_session.registry.has():
+            return self.__scoped_session(bind=bind)
         return self.__scoped_session()
 
+    def create_session(self):
+        """
+        Creates a session that is not part of the scoped registry, for work
+        that outlives the request (like streaming a response). The caller
+        has to close it.
+        """
+        return sessionmaker(autocommit=False, bind=self.engine)()
+
     def remove_session(self):
         # A good post about this:
         # http://kronosapiens.github.io/blog/2014/07/29/setting-up-unit-tests-with-flask.html
         if self.__scoped_session is not None:
             self.__scoped_session.remove()
 
+    def begin_request_scope(self):
+        """
+        Starts a new session scope for the current request. No session is
+        created (and no connection checked out) until `session` is used.
+        Returns the token that has to be passed to `end_request_scope`.
+        """
+        return _session_scope.set(object())
+
+    def end_request_scope(self, token):
+        # Closing the session returns its connection to the pool and drops
+        # the identity map of the request.
+        self.remove_session()
+        _session_scope.reset(token)
+
+    @contextmanager
+    def shared_transaction(self):
+        """
+        Runs the block in a session scope of its own, whose sessions join a
+        single transaction: their commits do not commit it, the block
+        commits or rolls back the transaction it is given. A transaction
+        still open at the end of the block is rolled back.
+        """
+        connection = self.engine.connect()
+        transaction = connection.begin()
+        scope_token = self.begin_request_scope()
+        bind_token = _session_bind.set(connection)
+        try:
+            yield transaction
+        finally:
+            _session_bind.reset(bind_token)
+            self.end_request_scope(scope_token)
+            if transaction.is_active:
+                transaction.rollback()
+            connection.close()
+
     def test_mode(self):
         self.__test_mode = True
         self.__engine = None
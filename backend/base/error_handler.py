@@ -19,6 +19,8 @@ class Error(Enum):
     INVALID_INPUT_TYPE = 14
     NULL_FIELD_NOT_ALLOWED = 15
     INVALID_VALUE = 16
+    SERVER_BUSY = 17
+    VERSION_CONFLICT = 18
 
     @classmethod
     def handle_schema_errors(cls, error_dict, errors):
@@ -0,0 +1,27 @@
+import hashlib
+
+
+def make_etag(*parts):
+    """
+    Returns a strong ETag (quoted, as it is sent in headers) that changes
+    whenever any of the parts does.
+    """
+    return '"%s"' % hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def etag_matches(etag, if_none_match):
+    """
+    Tells if an ETag is in the value of an `If-None-Match` header. The
+    comparison is weak, as RFC 7232 asks for this header.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
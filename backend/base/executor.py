@@ -0,0 +1,78 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from base.config import settings
+from base.db import db
+from base.singleton import Singleton
+
+
+class ExecutorBusy(Exception):
+    pass
+
+
+class DBExecutor(metaclass=Singleton):
+    """
+    A bounded thread pool to run blocking database work (SQLAlchemy queries)
+    away from the Sanic event loop.
+
+    At most `DB_EXECUTOR_POOL_SIZE` calls run at the same time and at most
+    `DB_EXECUTOR_QUEUE_DEPTH` more wait for a free thread. Any call beyond
+    that raises `ExecutorBusy` instead of piling up behind a slow database.
+    """
+    __pool = None
+    __pending = 0
+
+    @property
+    def pool(self):
+        if self.__pool is None:
+            self.__pool = ThreadPoolExecutor(
+                max_workers=settings.DB_EXECUTOR_POOL_SIZE,
+                thread_name_prefix="db-executor"
+            )
+        return self.__pool
+
+    @property
+    def pending(self):
+        return self.__pending
+
+    @property
+    def is_full(self):
+        return self.__pending >= settings.DB_EXECUTOR_POOL_SIZE + settings.DB_EXECUTOR_QUEUE_DEPTH
+
+    async def run(self, func, *args, **kwargs):
+        # The counter is only touched from the event loop thread, so it
+        # does not need a lock.
+        if self.is_full:
+            raise ExecutorBusy()
+        self.__pending += 1
+        try:
+            # Run in a copy of the current context so that the call uses the
+            # session scope of the request that made it.
+            context = contextvars.copy_context()
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                self.pool,
+                partial(context.run, self.call_in_session, func, *args, **kwargs)
+            )
+        finally:
+            self.__pending -= 1
+
+    @staticmethod
+    def call_in_session(func, *args, **kwargs):
+        # The session is keyed by request scope (or by thread outside of a
+        # request), removing it once the call is over returns the connection
+        # to the pool without waiting for the response to be written.
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db.remove_session()
+
+    def shutdown(self, wait=True):
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=wait)
+            self.__pool = None
+
+
+executor = DBExecutor()
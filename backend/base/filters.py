@@ -0,0 +1,110 @@
+import datetime
+
+
+# Filter operators that clients can use in the query string, as
+# `?<field>=<value>` (eq) or `?<field>__<operator>=<value>`
+FILTER_EQ = "eq"
+FILTER_IN = "in"
+FILTER_RANGE = "range"
+FILTER_PREFIX = "prefix"
+FILTER_OPERATORS = (FILTER_EQ, FILTER_IN, FILTER_RANGE, FILTER_PREFIX)
+
+# Most values an `in` filter can have
+MAX_IN_VALUES = 200
+
+
+class InvalidQueryArgument(Exception):
+    """
+    Raised when a query string argument of a request cannot be used. The
+    `field` is the name of the argument and is returned to the client.
+    """
+    def __init__(self, field, context=None):
+        super().__init__(field)
+        self.field = field
+        self.context = context
+
+
+def parse_filter_arg(arg):
+    """
+    Splits a query string argument like `text__prefix` in the field name
+    and the operator.
+    """
+    field, _, operator = arg.partition("__")
+    return field, operator or FILTER_EQ
+
+
+def coerce_value(column, value):
+    """
+    Converts a value that came as a string (or JSON) to the Python type of
+    the column, raises ValueError (or KeyError) if it cannot be converted.
+    """
+    column_type = column.type
+    enum_class = getattr(column_type, "enum_class", None)
+    if enum_class is not None:
+        return enum_class(value)
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return value
+    if isinstance(value, python_type):
+        return value
+    if python_type is bool:
+        if value in ("true", "1"):
+            return True
+        if value in ("false", "0"):
+            return False
+        raise ValueError(value)
+    if python_type is datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+    if python_type is datetime.date:
+        return datetime.date.fromisoformat(value)
+    return python_type(value)
+
+
+def split_values(value):
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return value.split(",")
+
+
+def build_filter(column, operator, value):
+    """
+    Builds the SQLAlchemy expression that filters `column` with `operator`.
+    Values of `in` and `range` are comma separated in query strings and
+    lists in JSON, either end of a range can be left empty.
+    """
+    if operator == FILTER_EQ:
+        return column == coerce_value(column, value)
+
+    if operator == FILTER_IN:
+        values = split_values(value)
+        if not values or len(values) > MAX_IN_VALUES:
+            raise ValueError(value)
+        return column.in_([coerce_value(column, v) for v in values])
+
+    if operator == FILTER_RANGE:
+        values = split_values(value)
+        if len(values) != 2:
+            raise ValueError(value)
+        low, high = values
+        criteria = []
+        if low not in ("", None):
+            criteria.append(column >= coerce_value(column, low))
+        if high not in ("", None):
+            criteria.append(column <= coerce_value(column, high))
+        if not criteria:
+            raise ValueError(value)
+        return criteria[0] if len(criteria) == 1 else criteria[0] & criteria[1]
+
+    if operator == FILTER_PREFIX:
+        try:
+            is_string = column.type.python_type is str
+        except NotImplementedError:
+            is_string = False
+        if not is_string or not isinstance(value, str) or not value:
+            raise ValueError(value)
+        # A btree index serves this only with a pattern operator class
+        # (or the C collation) on PostgreSQL.
+        return column.startswith(value, autoescape=True)
+
+    raise ValueError(operator)
@@ -0,0 +1,120 @@
+from collections import namedtuple
+from sqlalchemy import select
+
+from base.model_plan import model_plan
+from base.rows import schema_columns
+
+
+# Name of the column that holds the key an included row belongs to
+INCLUDE_KEY = "include_key"
+
+# How the rows of an include are found: the column of the model whose
+# values are the keys, the column they are matched against (of the
+# related table or of the link table) and what is selected from.
+Relation = namedtuple("Relation", ("key_column", "match_column", "table", "from_clause", "many"))
+
+# Columns of link models that record who wrote the link, not what it links
+AUDIT_COLUMNS = ("created_by_id", "updated_by_id")
+
+
+def build_relation(model, name, through=None, target=None):
+    table = model.__table__
+    if through is None:
+        for related in model_plan(model).related_fields:
+            if related.name == name:
+                column = table.columns[related.column]
+                target = list(column.foreign_keys)[0].column
+                return Relation(column, target, target.table, target.table, False)
+        raise ValueError("%s has no foreign key for %s" % (model.__name__, name))
+
+    link = through.__table__
+    source = None
+    targets = []
+    for column in link.columns:
+        if target is None and column.name in AUDIT_COLUMNS:
+            continue
+        for fk in column.foreign_keys:
+            if fk.references(table) and source is None and column.name != target:
+                source = (column, fk.column)
+            elif target is None or column.name == target:
+                targets.append((column, fk.column))
+    if source is None or len(targets) != 1:
+        raise ValueError("%s does not link %s to one other model, set the target column of %s" % (
+            through.__name__, model.__name__, name
+        ))
+    column, target_column = targets[0]
+    return Relation(
+        source[1],
+        source[0],
+        target_column.table,
+        link.join(target_column.table, column == target_column),
+        True
+    )
+
+
+class Include(object):
+    """
+    A relation of a model that clients can have expanded in the items of
+    read responses with `?include=<name>`, dumped with `schema_class`.
+
+    Without `through`, `<name>` is a foreign key of the model named
+    `<name>_id` or `<name>_fk` (see `base.model_plan`), and each item gets
+    the related object (or null). With `through`, a link model with foreign
+    keys to the model and to the related one, each item gets the list of
+    related objects. The foreign key to the related model is found by
+    itself when it is the only other one (besides `created_by_id` and
+    `updated_by_id`), otherwise `target` names its column.
+
+    The related rows of all the items of a response are read with a single
+    `IN (...)` query, see `get_statement`.
+    """
+
+    def __init__(self, schema_class, through=None, target=None):
+        self.schema_class = schema_class
+        self.through = through
+        self.target = target
+        self.__relations = {}
+
+    def get_relation(self, model, name):
+        # Built on first use, the related tables may not be loaded before
+        relation = self.__relations.get((model, name))
+        if relation is None:
+            relation = build_relation(model, name, self.through, self.target)
+            self.__relations[(model, name)] = relation
+        return relation
+
+    def get_table_names(self, model, name):
+        relation = self.get_relation(model, name)
+        names = [relation.table.name]
+        if self.through is not None:
+            names.append(self.through.__table__.name)
+        return names
+
+    def get_keys(self, model, name, items):
+        key = self.get_relation(model, name).key_column.key
+        return set(getattr(item, key) for item in items) - {None}
+
+    def get_statement(self, model, name, keys):
+        relation = self.get_relation(model, name)
+        columns = schema_columns(relation.table, self.schema_class()) or list(relation.table.columns)
+        statement = select([relation.match_column.label(INCLUDE_KEY)] + columns)
+        statement = statement.select_from(relation.from_clause)
+        return statement.where(relation.match_column.in_(sorted(keys)))
+
+    def attach(self, model, name, items, data, rows):
+        """
+        Sets the dumped related rows in the dumped items.
+        """
+        relation = self.get_relation(model, name)
+        dumped = self.schema_class().dump(rows, many=True).data
+        key = relation.key_column.key
+        if relation.many:
+            related = {}
+            for row, value in zip(rows, dumped):
+                related.setdefault(getattr(row, INCLUDE_KEY), []).append(value)
+            for item, item_data in zip(items, data):
+                item_data[name] = related.get(getattr(item, key), [])
+        else:
+            related = {getattr(row, INCLUDE_KEY): value for row, value in zip(rows, dumped)}
+            for item, item_data in zip(items, data):
+                item_data[name] = related.get(getattr(item, key))
@@ -0,0 +1,256 @@
+import asyncio
+import time
+
+
+# Longest expiration time memcache reads as seconds rather than a unix time
+MAX_RELATIVE_EXPIRE = 30 * 24 * 3600
+
+
+class MemcacheError(Exception):
+    """
+    Raised when a memcache command fails, times out or the server cannot be
+    reached. The connection it ran on is dropped.
+    """
+    pass
+
+
+def encode_key(key):
+    """
+    Returns a key as bytes, raises ValueError if memcache cannot store it
+    (longer than 250 bytes, or with spaces or control characters).
+    """
+    encoded = key.encode("utf-8")
+    if not encoded or len(encoded) > 250 or any(c <= 32 or c == 127 for c in encoded):
+        raise ValueError("invalid memcache key %r" % key)
+    return encoded
+
+
+def expire_after(seconds):
+    """
+    Returns the expiration time of a key that expires in `seconds`.
+    """
+    if seconds > MAX_RELATIVE_EXPIRE:
+        return int(time.time()) + seconds
+    return seconds
+
+
+def encode_value(value):
+    if isinstance(value, bytes):
+        return value
+    return str(value).encode("utf-8")
+
+
+class Connection(object):
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def read_line(self):
+        line = await self.reader.readuntil(b"\r\n")
+        return line[:-2]
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncMemcacheClient(object):
+    """
+    An asyncio client of the memcache text protocol, with a pool of at most
+    `pool_size` connections to one server.
+
+    Every call fails with MemcacheError after `timeout` seconds instead of
+    waiting on a slow server. A connection that fails (or times out) is
+    closed and a new one is opened by the next call, so the client recovers
+    once the server is back. Reads that fail on a pooled connection (closed
+    by the server in the meantime) are retried once on a new one.
+
+    The `*_many` commands send all their commands at once and then read all
+    the replies, with one round trip to the server.
+    """
+
+    def __init__(self, host, port=11211, pool_size=10, timeout=0.5):
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.__idle = []
+        self.__size = 0
+        self.__released = None
+
+    async def connect(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        return Connection(reader, writer)
+
+    async def acquire(self):
+        while not self.__idle and self.__size >= self.pool_size:
+            if self.__released is None:
+                self.__released = asyncio.Event()
+            await self.__released.wait()
+        if self.__idle:
+            return self.__idle.pop(), True
+        self.__size += 1
+        try:
+            return await self.connect(), False
+        except BaseException:
+            self.__size -= 1
+            self.notify()
+            raise
+
+    def release(self, connection, broken=False):
+        if broken:
+            connection.close()
+            self.__size -= 1
+        else:
+            self.__idle.append(connection)
+        self.notify()
+
+    def notify(self):
+        if self.__released is not None:
+            self.__released.set()
+            self.__released = None
+
+    async def run(self, func, retry=False):
+        """
+        Runs `await func(connection)` on a pooled connection, within the
+        timeout.
+        """
+        try:
+            return await asyncio.wait_for(self.run_on_connection(func, retry), self.timeout)
+        except asyncio.TimeoutError:
+            raise MemcacheError("timed out")
+
+    async def run_on_connection(self, func, retry):
+        try:
+            connection, pooled = await self.acquire()
+        except OSError as e:
+            raise MemcacheError(str(e))
+        try:
+            result = await func(connection)
+        except (OSError, EOFError, asyncio.LimitOverrunError) as e:
+            self.release(connection, broken=True)
+            if retry and pooled:
+                return await self.run_on_connection(func, False)
+            raise MemcacheError(str(e))
+        except BaseException:
+            # Cancelled or timed out, the reply may still be on its way
+            self.release(connection, broken=True)
+            raise
+        self.release(connection)
+        return result
+
+    async def get_many(self, keys):
+        """
+        Returns a dict of the keys that were found to their values (bytes).
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        command = b"get " + b" ".join(encode_key(key) for key in keys) + b"\r\n"
+
+        async def get(connection):
+            connection.writer.write(command)
+            values = {}
+            while True:
+                line = await connection.read_line()
+                if line == b"END":
+                    return values
+                parts = line.split()
+                if parts[0] != b"VALUE":
+                    raise MemcacheError(line.decode("utf-8", "replace"))
+                data = await connection.reader.readexactly(int(parts[3]) + 2)
+                values[parts[1].decode("utf-8")] = data[:-2]
+
+        return await self.run(get, retry=True)
+
+    async def get(self, key):
+        return (await self.get_many([key])).get(key)
+
+    async def store_many(self, command, items, expire=0):
+        """
+        Runs a storage command (`set`, `add`...) for each key and value of
+        `items`, returns a dict of the keys to whether they were stored.
+        """
+        items = list(items.items())
+        if not items:
+            return {}
+        commands = []
+        for key, value in items:
+            value = encode_value(value)
+            commands.append(b"%s %s 0 %d %d\r\n%s\r\n" % (
+                command.encode("utf-8"), encode_key(key), expire, len(value), value
+            ))
+
+        async def store(connection):
+            connection.writer.write(b"".join(commands))
+            replies = {}
+            for key, _ in items:
+                reply = await connection.read_line()
+                if reply not in (b"STORED", b"NOT_STORED", b"EXISTS", b"NOT_FOUND"):
+                    raise MemcacheError(reply.decode("utf-8", "replace"))
+                replies[key] = reply == b"STORED"
+            return replies
+
+        return await self.run(store)
+
+    async def set_many(self, items, expire=0):
+        return await self.store_many("set", items, expire)
+
+    async def set(self, key, value, expire=0):
+        return (await self.set_many({key: value}, expire))[key]
+
+    async def add(self, key, value, expire=0):
+        return (await self.store_many("add", {key: value}, expire))[key]
+
+    async def append(self, key, value):
+        """
+        Appends to the value of a key, returns False if there is no such key.
+        """
+        return (await self.store_many("append", {key: value}))[key]
+
+    async def key_command_many(self, command, keys, expected, *args):
+        """
+        Runs a command that takes a key (and the same `args`) for each of
+        the keys, returns a dict of the keys to whether the reply was the
+        `expected` one rather than NOT_FOUND.
+        """
+        keys = list(keys)
+        if not keys:
+            return {}
+        suffix = b"".join(b" " + encode_value(arg) for arg in args)
+        commands = b"".join(b"%s %s%s\r\n" % (command, encode_key(key), suffix) for key in keys)
+
+        async def send(connection):
+            connection.writer.write(commands)
+            replies = {}
+            for key in keys:
+                reply = await connection.read_line()
+                if reply not in (expected, b"NOT_FOUND"):
+                    raise MemcacheError(reply.decode("utf-8", "replace"))
+                replies[key] = reply == expected
+            return replies
+
+        return await self.run(send)
+
+    async def delete_many(self, keys):
+        """
+        Deletes the keys, returns a dict of the keys to whether they existed.
+        """
+        return await self.key_command_many(b"delete", keys, b"DELETED")
+
+    async def delete(self, key):
+        return (await self.delete_many([key]))[key]
+
+    async def touch_many(self, keys, expire):
+        """
+        Sets a new expiration time on the keys, returns a dict of the keys to
+        whether they existed.
+        """
+        return await self.key_command_many(b"touch", keys, b"TOUCHED", expire)
+
+    async def touch(self, key, expire):
+        return (await self.touch_many([key], expire))[key]
+
+    async def close(self):
+        while self.__idle:
+            self.__idle.pop().close()
+            self.__size -= 1
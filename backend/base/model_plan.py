@@ -0,0 +1,50 @@
+from collections import namedtuple
+
+
+# A foreign key of a model whose column is named `<name>_id` or `<name>_fk`,
+# so that the related instance is expected in the `<name>` attribute
+RelatedField = namedtuple("RelatedField", ("name", "column", "target"))
+
+# What the write path of the controllers needs to know about a model. Built
+# once per model, only read afterwards.
+ModelPlan = namedtuple("ModelPlan", (
+    "model",
+    "has_foreign_keys",
+    "related_fields",
+    "has_created_from",
+    "has_created_by_id",
+    "has_updated_by_id"
+))
+
+_model_plans = {}
+
+
+def build_model_plan(model):
+    columns = model.__table__.columns
+    related_fields = []
+    foreign_keys = [c for c in columns.values() if c.foreign_keys]
+    for c in foreign_keys:
+        if c.name[-3:] == "_id" or c.name[-3:] == "_fk":
+            fk = list(c.foreign_keys)[0]
+            # The name of the target column is read from the definition of the
+            # key, its table may not be loaded yet.
+            target = fk.target_fullname.rsplit(".", 1)[-1]
+            related_fields.append(RelatedField(c.name[:-3], c.name, target))
+    return ModelPlan(
+        model=model,
+        has_foreign_keys=bool(foreign_keys),
+        related_fields=tuple(related_fields),
+        has_created_from=hasattr(model, "created_from"),
+        has_created_by_id=hasattr(model, "created_by_id"),
+        has_updated_by_id=hasattr(model, "updated_by_id")
+    )
+
+
+def model_plan(model):
+    """
+    Returns the plan of a model, built on first use.
+    """
+    plan = _model_plans.get(model)
+    if plan is None:
+        plan = _model_plans[model] = build_model_plan(model)
+    return plan
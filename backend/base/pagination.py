@@ -0,0 +1,162 @@
+import base64
+import datetime
+import enum
+import json
+from sqlalchemy import literal, tuple_
+
+from base.filters import InvalidQueryArgument
+
+
+class InvalidPageArgument(InvalidQueryArgument):
+    pass
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.name
+    return value
+
+
+def _from_json(column, value):
+    column_type = column.type
+    if hasattr(column_type, "enum_class") and column_type.enum_class is not None:
+        return column_type.enum_class[value]
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+    if python_type is datetime.date:
+        return datetime.date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values):
+    data = json.dumps([_to_json(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError("cursor does not match the sort columns")
+    return [_from_json(c, v) for c, v in zip(columns, values)]
+
+
+class KeysetPage(object):
+    """
+    One page of a list, read with keyset (cursor) pagination.
+
+    Rows are ordered by the sort columns, the last of which must be unique
+    (the primary key). The page is selected with a `WHERE (sort columns) >
+    (cursor)` criterion instead of an OFFSET, so reading any page costs the
+    same however deep it is, given an index on the sort columns.
+
+    Cursors are opaque to clients: the sort column values of the first/last
+    row of a page, as url safe base64 encoded JSON.
+    """
+
+    def __init__(self, columns, limit, after=None, before=None):
+        self.columns = columns
+        self.limit = limit
+        self.after = after
+        self.before = before
+        self.next_cursor = None
+        self.prev_cursor = None
+
+    @classmethod
+    def from_args(cls, args, columns, page_size, max_page_size):
+        """
+        Reads the page from the query string: `limit` (at most
+        `max_page_size`) and one of the `after` or `before` cursors.
+        """
+        limit = args.get("limit")
+        if limit is None:
+            limit = page_size
+        else:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise InvalidPageArgument("limit")
+            if limit < 1:
+                raise InvalidPageArgument("limit")
+        limit = min(limit, max_page_size)
+
+        cursors = {}
+        for field in ("after", "before"):
+            cursor = args.get(field)
+            if cursor:
+                try:
+                    cursors[field] = decode_cursor(cursor, columns)
+                except (ValueError, TypeError, KeyError):
+                    raise InvalidPageArgument(field)
+        if len(cursors) > 1:
+            raise InvalidPageArgument("before")
+        return cls(columns, limit, **cursors)
+
+    def _key(self, values):
+        if len(self.columns) == 1:
+            return self.columns[0], literal(values[0], self.columns[0].type)
+        return (
+            tuple_(*self.columns),
+            tuple_(*[literal(v, c.type) for c, v in zip(self.columns, values)])
+        )
+
+    @property
+    def criteria(self):
+        if self.after is not None:
+            column, cursor = self._key(self.after)
+            return [column > cursor]
+        if self.before is not None:
+            column, cursor = self._key(self.before)
+            return [column < cursor]
+        return []
+
+    @property
+    def order_by(self):
+        # Pages before a cursor are read backwards from the cursor and
+        # reversed in `finish`
+        if self.before is not None:
+            return [c.desc() for c in self.columns]
+        return [c.asc() for c in self.columns]
+
+    @property
+    def fetch_limit(self):
+        # One extra row tells if there is a page after this one
+        return self.limit + 1
+
+    def row_cursor(self, row):
+        return encode_cursor([getattr(row, c.key) for c in self.columns])
+
+    def finish(self, rows):
+        """
+        Trims the rows read with `fetch_limit` to the page and sets the
+        cursors of the next and previous pages.
+        """
+        has_more = len(rows) > self.limit
+        rows = list(rows[:self.limit])
+        if self.before is not None:
+            rows.reverse()
+
+        if rows:
+            if self.before is not None:
+                has_next, has_prev = True, has_more
+            else:
+                has_next, has_prev = has_more, self.after is not None
+            if has_next:
+                self.next_cursor = self.row_cursor(rows[-1])
+            if has_prev:
+                self.prev_cursor = self.row_cursor(rows[0])
+        return rows
+
+    def headers(self):
+        headers = {}
+        if self.next_cursor:
+            headers["X-Next-Cursor"] = self.next_cursor
+        if self.prev_cursor:
+            headers["X-Prev-Cursor"] = self.prev_cursor
+        return headers
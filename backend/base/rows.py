@@ -0,0 +1,46 @@
+from collections import namedtuple
+from marshmallow import fields as ma_fields
+
+
+_row_classes = {}
+
+
+def row_class(names):
+    """
+    Returns a lightweight, read-only row class with the given column names.
+    Schemas dump these rows the same way as model instances, by attribute.
+
+    Classes are cached per set of names since creating a namedtuple is slow.
+    """
+    names = tuple(names)
+    cls = _row_classes.get(names)
+    if cls is None:
+        cls = namedtuple("Row", names)
+        _row_classes[names] = cls
+    return cls
+
+
+def make_rows(names, records):
+    """
+    Returns the records (tuples of values, like the rows of a SQLAlchemy
+    result) as row objects with the given column names.
+    """
+    cls = row_class(names)
+    return [cls(*record) for record in records]
+
+
+def schema_columns(table, schema):
+    """
+    Returns the columns of a table that a schema needs to dump its rows, in
+    table order, or None when all of them are needed.
+    """
+    names = set(c.name for c in table.primary_key.columns)
+    for name, field in schema.fields.items():
+        if field.load_only:
+            continue
+        attribute = field.attribute or name
+        if attribute in table.columns:
+            names.add(attribute)
+        elif isinstance(field, (ma_fields.Function, ma_fields.Method)):
+            return None
+    return [c for c in table.columns if c.name in names]
@@ -1,8 +1,341 @@
-from marshmallow import Schema, post_load
+from collections.abc import Mapping
+from marshmallow import Schema, ValidationError, post_load, missing
+from marshmallow import fields as ma_fields
+from marshmallow.decorators import POST_LOAD
+from marshmallow.schema import MarshalResult, UnmarshalResult
+from marshmallow.utils import ensure_text_type, get_func_args
+
 from base import schema_fields as fields
 
 
-class BaseSchema(Schema):
+class _CannotCompile(Exception):
+    pass
+
+
+# Types of values that fields inferred by marshmallow (names in Meta.fields
+# without a declared field) dump unchanged
+_PLAIN_TYPES = (str, int, float, bool, type(None))
+
+
+def _compile_field(index, name, field, declared, env):
+    """
+    Returns the source lines that dump one field of an object `obj` into
+    `result`, the same way marshmallow would.
+    """
+    key = field.dump_to or name
+    field_class = type(field)
+
+    if isinstance(field, ma_fields.Function):
+        func = field.serialize_func
+        if (field_class._serialize is not ma_fields.Function._serialize or
+                func is None or len(get_func_args(func)) > 1):
+            raise _CannotCompile(name)
+        env["func_%d" % index] = func
+        return [
+            "    try:",
+            "        result[%r] = func_%d(obj)" % (key, index),
+            "    except AttributeError:",
+            "        pass",
+        ]
+
+    attribute = field.attribute or name
+    if (not attribute.isidentifier() or field.default is not missing or
+            field_class.serialize is not ma_fields.Field.serialize and
+            field_class.serialize is not ma_fields.Number.serialize):
+        raise _CannotCompile(name)
+
+    lines = ["    value = getattr(obj, %r, missing)" % attribute]
+    if not declared:
+        # marshmallow infers these fields from the values of the first object
+        # (and fails if it has no such attribute), plain values come out
+        # unchanged whatever the inferred field is.
+        return lines + [
+            "    if value.__class__ not in plain_types:",
+            "        raise CannotCompile(%r)" % name,
+            "    result[%r] = value" % key,
+        ]
+
+    lines.append("    if value is not missing:")
+    if field_class._serialize is ma_fields.Field._serialize:
+        lines.append("        result[%r] = value" % key)
+    elif (isinstance(field, ma_fields.Integer) and not field.as_string and
+            field_class._serialize is ma_fields.Number._serialize and
+            field_class._validated is ma_fields.Number._validated and
+            field_class._format_num is ma_fields.Number._format_num):
+        lines.append("        result[%r] = None if value is None else int(value)" % key)
+    elif field_class._serialize is ma_fields.String._serialize:
+        lines.append(
+            "        result[%r] = value if value is None or value.__class__ is str "
+            "else ensure_text_type(value)" % key
+        )
+    else:
+        raise _CannotCompile(name)
+    return lines
+
+
+def compile_dumper(schema):
+    """
+    Compiles the fields of a schema instance into a function that dumps one
+    object to a dict, with the attribute lookups and field conversions
+    resolved ahead of time and `Function` fields called inline.
+
+    Returns None if the schema uses anything that is not compiled (hooks,
+    nested fields, other field types...), marshmallow is used for those.
+    """
+    schema_class = type(schema)
+    processors = schema_class.__processors__
+    if (schema.prefix or schema.extra or
+            schema_class.get_attribute is not Schema.get_attribute or
+            any(processors[tag] for tag in processors if tag[0] in ("pre_dump", "post_dump"))):
+        return None
+
+    env = {
+        "missing": missing,
+        "plain_types": _PLAIN_TYPES,
+        "ensure_text_type": ensure_text_type,
+        "CannotCompile": _CannotCompile,
+    }
+    lines = ["def dump(obj):", "    result = {}"]
+    try:
+        for index, (name, field) in enumerate(schema.fields.items()):
+            if field.load_only:
+                continue
+            lines += _compile_field(
+                index, name, field, name in schema.declared_fields, env
+            )
+    except _CannotCompile:
+        return None
+    lines.append("    return result")
+
+    exec("\n".join(lines), env)
+    return env["dump"]
+
+
+def _compile_load_field(name, field, partial=False):
+    """
+    Returns the source lines that load one field of the input `data` into
+    `result`. Any invalid value raises, the caller then lets marshmallow
+    load the input to report the errors. With `partial`, a missing field is
+    left out, as marshmallow does with `partial=True`.
+
+    Fields are used from the `fields` of the schema instance that loads, as
+    nested fields are bound to their schema instance.
+    """
+    key = field.attribute or name
+    field_class = type(field)
+    if "." in key:
+        raise _CannotCompile(name)
+
+    lines = ["    value = data.get(%r, missing)" % name]
+    if field.load_from:
+        lines += [
+            "    if value is missing:",
+            "        value = data.get(%r, missing)" % field.load_from,
+        ]
+    if field.missing is not missing and not partial:
+        lines += [
+            "    if value is missing:",
+            "        value = fields[%r].missing()" % name if callable(field.missing) else
+            "        value = fields[%r].missing" % name,
+        ]
+    if field.required and not partial:
+        lines += [
+            "    if value is missing:",
+            "        raise CannotCompile(%r)" % name,
+        ]
+    lines.append("    if value is not missing:")
+
+    if field.validators:
+        validate = ["        fields[%r]._validate(value)" % name]
+    else:
+        validate = []
+
+    if field_class.deserialize is not ma_fields.Field.deserialize:
+        convert = None
+    elif field_class._deserialize is ma_fields.Field._deserialize:
+        convert = []
+    elif (isinstance(field, ma_fields.Integer) and not getattr(field, "strict", False) and
+            field_class._deserialize is ma_fields.Number._deserialize and
+            field_class._validated is ma_fields.Number._validated and
+            field_class._format_num is ma_fields.Number._format_num):
+        convert = ["            value = int(value)"]
+    elif field_class._deserialize is ma_fields.String._deserialize:
+        convert = [
+            "            if value.__class__ is not str:",
+            "                raise CannotCompile(%r)" % name,
+        ]
+    else:
+        convert = None
+
+    if convert is None:
+        # Any other field (nested schemas included) deserializes itself
+        lines += [
+            "        value = fields[%r].deserialize(value, %r, data)" % (name, field.load_from or name),
+            "        result[%r] = value" % key,
+        ]
+        return lines
+
+    lines.append("        if value is None:")
+    if field.allow_none is True:
+        lines.append("            result[%r] = None" % key)
+    else:
+        lines.append("            raise CannotCompile(%r)" % name)
+    lines.append("        else:")
+    lines += convert or ["            pass"]
+    lines += ["    " + line for line in validate]
+    lines.append("            result[%r] = value" % key)
+    return lines
+
+
+def compile_loader(schema, partial=False):
+    """
+    Compiles the fields of a schema instance into a function that loads
+    (deserializes and validates) one input dict with the `fields` of a
+    schema instance, without post_load hooks. With `partial`, only the
+    fields in the input are loaded.
+
+    The function only handles valid input, it raises on anything invalid.
+    Returns None if the schema has hooks or validators that need marshmallow.
+    """
+    schema_class = type(schema)
+    processors = schema_class.__processors__
+    if (schema.strict or schema.ordered or
+            any(processors[tag] for tag in processors if tag[0] != POST_LOAD)):
+        return None
+
+    env = {
+        "missing": missing,
+        "CannotCompile": _CannotCompile,
+    }
+    lines = [
+        "def load(data, fields):",
+        "    if data.__class__ is not dict:",
+        "        raise CannotCompile(None)",
+        "    result = {}",
+    ]
+    try:
+        for name, field in schema.fields.items():
+            if field.dump_only:
+                continue
+            lines += _compile_load_field(name, field, partial)
+    except _CannotCompile:
+        return None
+    lines.append("    return result")
+
+    exec("\n".join(lines), env)
+    return env["load"]
+
+
+def compile_partial_loader(schema):
+    return compile_loader(schema, partial=True)
+
+
+class CompiledSchema(Schema):
+    """
+    Dumps and loads go through functions compiled once per schema class (and
+    set of `only`/`exclude`/`load_only`/`dump_only` fields and `prefix`) by
+    `compile_dumper` and `compile_loader`.
+    They give the same results as marshmallow but much faster.
+
+    Anything the compiled functions cannot handle is handled by marshmallow:
+    mappings on dump, and invalid input on load, so errors are reported
+    exactly as before.
+    """
+    compile_dumps = True
+    compile_loads = True
+    __compiled = {}
+
+    def get_compiled(self, compile_function):
+        # Instance options that change which fields are dumped or loaded,
+        # or how, are part of the key
+        key = (
+            compile_function,
+            type(self),
+            tuple(self.only) if self.only else None,
+            tuple(self.exclude) if self.exclude else None,
+            tuple(sorted(self.load_only)),
+            tuple(sorted(self.dump_only)),
+            self.prefix,
+            bool(self.extra)
+        )
+        try:
+            return self.__compiled[key]
+        except KeyError:
+            compiled = self.__compiled[key] = compile_function(self)
+            return compiled
+
+    def get_compiled_dumper(self):
+        return self.get_compiled(compile_dumper)
+
+    def get_compiled_loader(self, partial=False):
+        return self.get_compiled(compile_partial_loader if partial else compile_loader)
+
+    def dump(self, obj, many=None, update_fields=True, **kwargs):
+        dumper = self.get_compiled_dumper() if self.compile_dumps else None
+        if dumper is not None:
+            many = self.many if many is None else bool(many)
+            if many:
+                obj = list(obj)
+            first = obj[0] if many and obj else obj
+            # marshmallow reads mappings by key, not attribute
+            if first is not None and not isinstance(first, Mapping):
+                try:
+                    if many:
+                        return MarshalResult([dumper(o) for o in obj], {})
+                    return MarshalResult(dumper(obj), {})
+                except Exception:
+                    # Let marshmallow dump it and report the errors
+                    pass
+        return super().dump(obj, many=many, update_fields=update_fields, **kwargs)
+
+    def load(self, data, many=None, partial=None, postprocess=True):
+        """
+        Same as marshmallow's `load`, with `postprocess=False` the post_load
+        hooks are not run (see `postprocess_load`).
+        """
+        many = self.many if many is None else bool(many)
+        partial = self.partial if partial is None else partial
+        loader = None
+        # Partial loads of some of the fields are left to marshmallow
+        if self.compile_loads and partial in (False, True):
+            loader = self.get_compiled_loader(partial)
+        if loader is not None:
+            try:
+                if many:
+                    if data.__class__ is not list:
+                        raise _CannotCompile(None)
+                    result = [loader(item, self.fields) for item in data]
+                else:
+                    result = loader(data, self.fields)
+            except Exception:
+                # Let marshmallow load it and report the errors
+                pass
+            else:
+                if not postprocess:
+                    return UnmarshalResult(result, {})
+                processed = self.postprocess_load(UnmarshalResult(result, {}), data, many=many)
+                if not processed.errors:
+                    return processed
+        return UnmarshalResult(*self._do_load(data, many, partial=partial, postprocess=postprocess))
+
+    def postprocess_load(self, result, original_data, many=None):
+        """
+        Runs the post_load hooks on the result of a `load(...,
+        postprocess=False)`, so one validated input can be turned into
+        several results (like instances for different schemas).
+        """
+        data, errors = result
+        if errors or not self._has_processors:
+            return UnmarshalResult(data, errors)
+        many = self.many if many is None else bool(many)
+        try:
+            data = self._invoke_load_processors(POST_LOAD, data, many, original_data=original_data)
+        except ValidationError as error:
+            errors = error.normalized_messages()
+        return UnmarshalResult(data, errors)
+
+
+class BaseSchema(CompiledSchema):
     id = fields.Integer(dump_only=True)
 
     created_by_id = fields.Integer(dump_only=True)
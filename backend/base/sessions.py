@@ -0,0 +1,95 @@
+import asyncio
+import time
+
+from base.cache import LRUCache
+from base.config import settings
+from base.memcache import MemcacheError, expire_after
+from base.singleton import Singleton
+
+
+def session_expires_at():
+    """
+    Returns the unix time a new session expires at whatever its use, 0 if
+    `SESSION_TTL` is not set.
+    """
+    return int(time.time()) + settings.SESSION_TTL if settings.SESSION_TTL else 0
+
+
+def session_value(user_id, expires_at):
+    return "%d:%d" % (user_id, expires_at)
+
+
+def parse_session(value):
+    """
+    Returns the user id and absolute expiry time of a session stored in
+    memcache. Sessions stored without an expiry time are only a user id.
+    """
+    user_id, _, expires_at = value.decode("ascii").partition(":")
+    return int(user_id), int(expires_at or 0)
+
+
+def session_expiry(expires_at, now=None):
+    """
+    Returns the memcache expiration time of a session used `now`: in
+    `SESSION_IDLE_TTL` seconds, but not after its absolute expiry time.
+    """
+    now = time.time() if now is None else now
+    idle = settings.SESSION_IDLE_TTL
+    if expires_at and (not idle or now + idle >= expires_at):
+        # Unix times are always read as such by memcache
+        return expires_at
+    return expire_after(idle) if idle else 0
+
+
+class SessionRefresher(metaclass=Singleton):
+    """
+    Extends the sessions that are used by `SESSION_IDLE_TTL` seconds.
+
+    A session is refreshed at most once every `SESSION_REFRESH_INTERVAL`
+    seconds by each process: requests only queue its token, and `run`
+    touches the queued ones every `flush_interval` seconds, with a `touch`
+    command per group of sessions that get the same expiration time. The
+    idle TTL should be well above the refresh interval, or sessions in use
+    can expire between two refreshes.
+    """
+    flush_interval = 5
+    recent_size = 65536
+    __recent = None
+    __pending = {}
+
+    @property
+    def recent(self):
+        if self.__recent is None:
+            self.__recent = LRUCache(self.recent_size, settings.SESSION_REFRESH_INTERVAL)
+        return self.__recent
+
+    def refresh(self, token, expires_at):
+        if not settings.SESSION_IDLE_TTL or self.recent.get(token) is not None:
+            return
+        self.recent.set(token, True)
+        self.__pending[token] = expires_at
+
+    def forget(self, token):
+        self.__pending.pop(token, None)
+
+    async def flush(self, store):
+        pending, self.__pending = self.__pending, {}
+        now = time.time()
+        groups = {}
+        for token, expires_at in pending.items():
+            groups.setdefault(session_expiry(expires_at, now), []).append(token)
+        for expire, tokens in groups.items():
+            try:
+                await store.touch_many(tokens, expire)
+            except MemcacheError:
+                # Touched with the next flush
+                for token in tokens:
+                    self.__pending.setdefault(token, pending[token])
+
+    async def run(self, store):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush(store)
+
+
+session_refresher = SessionRefresher()
@@ -0,0 +1,22 @@
+from sanic import response
+
+from base.coalesce import single_flight
+from base.user_cache import user_cache
+
+
+def collect_stats():
+    """
+    Returns the counters that the caches of this process keep.
+    """
+    return {
+        "coalesced_requests": single_flight.stats(),
+        "user_cache": user_cache.stats(),
+    }
+
+
+async def stats_route(request):
+    """
+    Serves the counters of this worker process (each worker of the server
+    keeps its own), for monitoring.
+    """
+    return response.json(collect_stats())
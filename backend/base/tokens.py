@@ -0,0 +1,146 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+from collections import namedtuple
+
+from sanic.log import error_logger
+
+from base.config import settings
+from base.memcache import MemcacheError, expire_after
+from base.singleton import Singleton
+
+
+# Prefix of signed tokens, session tokens are plain hex strings
+SIGNED_TOKEN_PREFIX = "s1"
+
+# What a valid signed token says
+TokenClaims = namedtuple("TokenClaims", ("user_id", "expires_at", "token_id"))
+
+
+def key_id(key):
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:8]
+
+
+def get_signing_keys():
+    """
+    Returns the keys that tokens can be signed with by their id. Tokens are
+    signed with `SECRET_KEY`, the `SECRET_KEY_FALLBACKS` (keys that were
+    rotated out) are only used to verify tokens signed before.
+    """
+    keys = [settings.SECRET_KEY] + list(settings.SECRET_KEY_FALLBACKS)
+    return {key_id(key): key for key in keys if key}
+
+
+def make_signature(key, message):
+    digest = hmac.new(key.encode("utf-8"), message.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def is_signed_token(token):
+    return token.startswith(SIGNED_TOKEN_PREFIX + ".")
+
+
+def sign_token(user_id, ttl=None):
+    """
+    Returns a token that authenticates the user for `ttl` seconds (by
+    default `SIGNED_TOKEN_TTL`) without a session: it carries the user id
+    and expiry time, signed with HMAC-SHA256 and `SECRET_KEY`.
+    """
+    expires_at = int(time.time()) + (settings.SIGNED_TOKEN_TTL if ttl is None else ttl)
+    token_id = os.urandom(8).hex()
+    kid = key_id(settings.SECRET_KEY)
+    message = "%s.%s.%d.%d.%s" % (SIGNED_TOKEN_PREFIX, kid, user_id, expires_at, token_id)
+    return "%s.%s" % (message, make_signature(settings.SECRET_KEY, message))
+
+
+def verify_token(token):
+    """
+    Returns the claims of a signed token, or None if it is malformed,
+    signed with an unknown key or expired. Revoked tokens are checked
+    separately, see `TokenDenylist`.
+    """
+    message, _, signature = token.rpartition(".")
+    parts = message.split(".")
+    if len(parts) != 5 or parts[0] != SIGNED_TOKEN_PREFIX:
+        return None
+    key = get_signing_keys().get(parts[1])
+    # Compared as bytes, compare_digest rejects strings that are not ASCII
+    if key is None or not hmac.compare_digest(
+            make_signature(key, message).encode("ascii"), signature.encode("ascii", "replace")):
+        return None
+    try:
+        claims = TokenClaims(int(parts[2]), int(parts[3]), parts[4])
+    except ValueError:
+        return None
+    if claims.expires_at <= time.time():
+        return None
+    return claims
+
+
+class TokenDenylist(metaclass=Singleton):
+    """
+    Signed tokens that were revoked (on logout) before they expire.
+
+    Revoked token ids are appended to memcache keys grouped by the time the
+    tokens expire, in buckets of `bucket_size` seconds that memcache drops
+    once all their tokens are expired. Each worker keeps the ids of the
+    buckets that are still live in memory and reads them all with one
+    `get` every `TOKEN_DENYLIST_SYNC_INTERVAL` seconds (see `run`), so
+    checking a token never calls memcache. Tokens revoked by another
+    worker are refused by this one after the next sync.
+    """
+    bucket_size = 3600
+    __revoked = {}
+
+    def bucket(self, expires_at):
+        return expires_at // self.bucket_size
+
+    def bucket_key(self, bucket):
+        return "token-deny:%d" % bucket
+
+    def live_buckets(self):
+        first = self.bucket(int(time.time()))
+        last = self.bucket(int(time.time()) + settings.SIGNED_TOKEN_TTL)
+        return range(first, last + 1)
+
+    def is_revoked(self, claims):
+        return claims.token_id in self.__revoked.get(self.bucket(claims.expires_at), ())
+
+    async def revoke(self, store, claims):
+        bucket = self.bucket(claims.expires_at)
+        self.__revoked.setdefault(bucket, set()).add(claims.token_id)
+        key = self.bucket_key(bucket)
+        # Kept until the last token of the bucket expires
+        expire = expire_after((bucket + 1) * self.bucket_size - int(time.time()) + 60)
+        if not await store.append(key, claims.token_id + ","):
+            if not await store.add(key, claims.token_id + ",", expire=expire):
+                await store.append(key, claims.token_id + ",")
+
+    async def sync(self, store):
+        buckets = list(self.live_buckets())
+        values = await store.get_many([self.bucket_key(bucket) for bucket in buckets])
+        revoked = {}
+        for bucket in buckets:
+            value = values.get(self.bucket_key(bucket))
+            local = self.__revoked.get(bucket, set())
+            ids = set(value.decode("ascii").split(",")) - {""} if value else set()
+            if ids or local:
+                revoked[bucket] = ids | local
+        self.__revoked = revoked
+
+    async def run(self, store):
+        while True:
+            try:
+                await self.sync(store)
+            except MemcacheError:
+                # The ids already known are kept until the store is back
+                pass
+            except Exception:
+                error_logger.exception("Could not sync the token denylist")
+            await asyncio.sleep(settings.TOKEN_DENYLIST_SYNC_INTERVAL)
+
+
+token_denylist = TokenDenylist()
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.schema import sort_tables
+
+
+def _batch_key(state):
+    """
+    Returns what new instances need to share to be inserted together (the
+    mapper and the attributes that are set), or None when an instance
+    cannot be inserted by `save_batched`.
+    """
+    mapper = state.mapper
+    if not state.transient or mapper.relationships or len(mapper.tables) != 1:
+        return None
+    keys = tuple(p.key for p in mapper.column_attrs if p.key in state.dict)
+    if not keys:
+        return None
+    return mapper, keys
+
+
+def save_batched(session, instances):
+    """
+    Saves model instances in the session with a fixed number of round trips
+    to the database, however many instances there are.
+
+    New instances are written with one multi-row INSERT ... RETURNING per
+    table (and set of attributes), in the order of the dependencies between
+    tables. The returned rows fill in their primary keys and defaults, and
+    the instances are then attached to the session as if they were loaded.
+    All other instances (and all of them on databases without RETURNING)
+    are added to the session and written by a single flush.
+    """
+    dialect = session.get_bind().dialect
+    can_batch = dialect.implicit_returning and dialect.supports_multivalues_insert
+
+    batches = OrderedDict()
+    others = []
+    for instance in instances:
+        key = _batch_key(inspect(instance)) if can_batch else None
+        if key is None:
+            others.append(instance)
+        else:
+            batches.setdefault(key, []).append(instance)
+
+    order = list(batches)
+    tables = set(mapper.local_table for mapper, _ in order)
+    if len(tables) > 1:
+        tables = sort_tables(tables)
+        order.sort(key=lambda key: tables.index(key[0].local_table))
+
+    for mapper, keys in order:
+        batch = batches[mapper, keys]
+        table = mapper.local_table
+        props = [mapper.get_property(key) for key in keys]
+        values = [
+            {prop.columns[0].key: getattr(instance, prop.key) for prop in props}
+            for instance in batch
+        ]
+        result = session.execute(table.insert().values(values).returning(*table.columns))
+        for instance, row in zip(batch, result.fetchall()):
+            state = inspect(instance)
+            for prop in mapper.column_attrs:
+                state.dict[prop.key] = row[prop.columns[0]]
+            make_transient_to_detached(instance)
+            session.add(instance)
+
+    if others:
+        for instance in others:
+            session.add(instance)
+        session.flush()
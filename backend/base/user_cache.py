@@ -0,0 +1,65 @@
+import threading
+
+from base.cache import LRUCache
+from base.config import settings
+from base.singleton import Singleton
+
+
+class UserCache(metaclass=Singleton):
+    """
+    Cache of the users that requests are authenticated as, by user id, so
+    that most requests do not query the database for their user.
+
+    Users are kept as read-only snapshots of their row (see `base.rows`),
+    which requests of any thread can share. Each worker process has its own
+    cache: a user that is updated or deleted (through the ORM, see
+    `apps.account.models`) is dropped at once from the cache of the process
+    that wrote it, other processes see the change within `USER_CACHE_TTL`
+    seconds. Sessions are not cached, a logout is
+    seen by all the processes at once.
+    """
+    __users = None
+    __hits = 0
+    __misses = 0
+    __lock = threading.Lock()
+
+    @property
+    def users(self):
+        if self.__users is None:
+            self.__users = LRUCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+        return self.__users
+
+    def get(self, user_id):
+        user = self.users.get(user_id)
+        with self.__lock:
+            if user is None:
+                self.__misses += 1
+            else:
+                self.__hits += 1
+        return user
+
+    def set(self, user_id, user):
+        self.users.set(user_id, user)
+
+    def invalidate(self, user_id):
+        self.users.delete(user_id)
+
+    def stats(self):
+        total = self.__hits + self.__misses
+        return {
+            "size": len(self.users),
+            "hits": self.__hits,
+            "misses": self.__misses,
+            "hit_rate": self.__hits / total if total else 0.0
+        }
+
+    def reset_stats(self):
+        with self.__lock:
+            self.__hits = 0
+            self.__misses = 0
+
+    def clear(self):
+        self.users.clear()
+
+
+user_cache = UserCache()
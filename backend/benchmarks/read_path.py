@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the ORM read path against the Core read path
+(`READ_ENGINE_CORE`) on a list of 100k questions: time and peak memory to
+read the rows and dump them with the schema.
+
+The rows are written to an in-memory SQLite database, so this measures
+what happens in Python once the database has answered.
+
+Run from the backend directory: python -m benchmarks.read_path
+"""
+import gc
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from apps.password.models import Question, QuestionDataType
+from apps.password.schema import QuestionSchema
+from base.rows import make_rows
+
+
+ROWS = 100000
+
+
+def make_engine():
+    engine = create_engine("sqlite://")
+    Question.__table__.create(engine)
+    engine.execute(Question.__table__.insert(), [
+        {
+            "id": i,
+            "text": "Question %d" % i,
+            "password_text": "What is %d?" % i,
+            "data_type": QuestionDataType.STRING,
+            "related_id": None
+        } for i in range(1, ROWS + 1)
+    ])
+    return engine
+
+
+def read_orm(engine):
+    session = sessionmaker(bind=engine)()
+    try:
+        items = session.query(Question).order_by(Question.id).all()
+        return QuestionSchema().dump(items, many=True).data
+    finally:
+        session.close()
+
+
+def read_core(engine):
+    session = sessionmaker(bind=engine)()
+    try:
+        result = session.execute(select(Question.__table__.columns).order_by(Question.id))
+        items = make_rows(result.keys(), result.fetchall())
+        return QuestionSchema().dump(items, many=True).data
+    finally:
+        session.close()
+
+
+def measure(name, read, engine):
+    gc.collect()
+    start = time.perf_counter()
+    data = read(engine)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    read(engine)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("%-5s %8.0f ms %10.0f rows/s %8.1f MB peak" % (
+        name, elapsed * 1000, ROWS / elapsed, peak / 1024 / 1024
+    ))
+    return data
+
+
+if __name__ == "__main__":
+    engine = make_engine()
+    orm = measure("orm", read_orm, engine)
+    core = measure("core", read_core, engine)
+    assert orm == core
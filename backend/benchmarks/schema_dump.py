@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark of BaseSchema dumps, compiled against plain marshmallow.
+
+Run from the backend directory: python -m benchmarks.schema_dump
+"""
+import timeit
+
+from sanic.response import json_dumps
+
+from apps.password.models import Question, QuestionDataType
+from apps.password.schema import QuestionSchema
+from base.rows import row_class
+
+
+ROWS = 1000
+REPEAT = 5
+NUMBER = 20
+
+
+def make_questions():
+    return [
+        Question(
+            id=i,
+            text="Question %d" % i,
+            password_text="What is %d?" % i,
+            data_type=QuestionDataType.STRING,
+            related_id=i // 10 or None
+        ) for i in range(ROWS)
+    ]
+
+
+def make_rows(questions):
+    names = ("id", "text", "password_text", "data_type", "related_id")
+    cls = row_class(names)
+    return [cls(*[getattr(q, n) for n in names]) for q in questions]
+
+
+def bench(name, objects):
+    compiled = QuestionSchema()
+    marshmallow = QuestionSchema()
+    marshmallow.compile_dumps = False
+
+    assert json_dumps(compiled.dump(objects, many=True).data) == \
+        json_dumps(marshmallow.dump(objects, many=True).data)
+
+    results = {}
+    for label, schema in (("marshmallow", marshmallow), ("compiled", compiled)):
+        best = min(timeit.repeat(
+            lambda: schema.dump(objects, many=True),
+            repeat=REPEAT,
+            number=NUMBER
+        ))
+        results[label] = best / NUMBER
+        print("%-10s %-12s %8.2f ms per %d rows" % (name, label, results[label] * 1000, ROWS))
+    print("%-10s speedup      %8.1fx" % (name, results["marshmallow"] / results["compiled"]))
+
+
+if __name__ == "__main__":
+    questions = make_questions()
+    bench("models", questions)
+    bench("rows", make_rows(questions))
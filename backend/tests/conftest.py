@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+# Tests run on a SQLite database of their own unless DB_TEST is set
+os.environ.setdefault("SECRET_KEY", "test-secret-key")
+os.environ.setdefault("DB_DEFAULT", "sqlite://")
+os.environ.setdefault("DB_TEST", "sqlite:///%s" % os.path.join(tempfile.mkdtemp(), "test.db"))
+
+import pytest  # noqa: E402
+from sqlalchemy.dialects.postgresql.base import PGCompiler  # noqa: E402
+from sqlalchemy.dialects.sqlite.base import SQLiteCompiler  # noqa: E402
+
+from apps import app  # noqa: E402,F401
+from apps.password.models import Question, QuestionDataType  # noqa: E402
+from base.async_db import async_db  # noqa: E402
+from base.cache import response_cache  # noqa: E402
+from base.db import db  # noqa: E402
+from tests.fakes import FakeAsyncPool  # noqa: E402
+
+
+@pytest.fixture
+def tables():
+    """
+    Creates the tables of the given models for a test and drops them after.
+    """
+    created = []
+
+    def create(*models):
+        for model in models:
+            model.__table__.create(db.engine)
+            created.append(model.__table__)
+
+    yield create
+    db.remove_session()
+    response_cache.clear()
+    for table in reversed(created):
+        table.drop(db.engine)
+
+
+@pytest.fixture
+def questions(tables):
+    tables(Question)
+    items = [
+        Question(text="q%d" % i, password_text="p%d" % i, data_type=QuestionDataType.STRING)
+        for i in range(5)
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+@pytest.fixture
+def async_pool(monkeypatch):
+    """
+    Runs the queries of `async_db` on the test database, see `FakeAsyncPool`.
+    """
+    pool = FakeAsyncPool()
+
+    async def get_pool():
+        return pool
+
+    monkeypatch.setattr(async_db, "get_pool", get_pool)
+    return pool
+
+
+@pytest.fixture
+def returning(monkeypatch):
+    """
+    Lets the SQLite test database run INSERT/UPDATE ... RETURNING, as
+    PostgreSQL does (SQLite supports it since 3.35).
+    """
+    monkeypatch.setattr(db.engine.dialect, "implicit_returning", True)
+    monkeypatch.setattr(SQLiteCompiler, "returning_clause", PGCompiler.returning_clause, raising=False)
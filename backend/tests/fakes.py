@@ -0,0 +1,161 @@
+import asyncio
+import re
+
+from sanic.response import json_dumps
+from sanic.server import CIDict
+
+from apps import app, CustomRequest
+from base.db import db
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def make_request(path, method="GET", headers=None, body=None):
+    """
+    Returns a request of the app, as the server would make it.
+    """
+    request_headers = CIDict()
+    for name, value in (headers or {}).items():
+        request_headers[name] = value
+    request = CustomRequest(path.encode("utf-8"), request_headers, "1.1", method, None)
+    request.app = app
+    request.body = json_dumps(body).encode("utf-8") if body is not None else b""
+    return request
+
+
+async def call_controller(controller_class, request, **kwargs):
+    return await controller_class.as_view()(request, **kwargs)
+
+
+class FakeConnection(object):
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch(self, sql, *values):
+        self.pool.queries.append(sql)
+        connection = db.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(re.sub(r"\$\d+", "?", sql), values)
+            return cursor.fetchall()
+        finally:
+            connection.close()
+
+
+class FakeAcquire(object):
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def __aenter__(self):
+        return FakeConnection(self.pool)
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakeAsyncPool(object):
+    """
+    Stands for the asyncpg pool of `base.async_db`: runs the statements it
+    compiled for PostgreSQL on the SQLite test database, and keeps them in
+    `queries`.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def acquire(self):
+        return FakeAcquire(self)
+
+
+class FakeMemcache(object):
+    """
+    An in-process server of the memcache text protocol commands that the
+    app uses. Values are kept in `data`, the commands received in
+    `commands`. With `hang` set it reads commands but never replies.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.commands = []
+        self.connections = 0
+        self.hang = False
+        self.server = None
+        self.writers = []
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+
+    async def stop(self):
+        self.server.close()
+        for writer in self.writers:
+            writer.close()
+        await self.server.wait_closed()
+
+    def drop_connections(self):
+        for writer in self.writers:
+            writer.close()
+        self.writers = []
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.writers.append(writer)
+        try:
+            while True:
+                line = (await reader.readuntil(b"\r\n"))[:-2]
+                parts = line.split()
+                self.commands.append(parts[0].decode("ascii"))
+                value = None
+                if parts[0] in (b"set", b"add", b"append"):
+                    value = (await reader.readexactly(int(parts[4]) + 2))[:-2]
+                if self.hang:
+                    continue
+                writer.write(self.reply(parts, value))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def reply(self, parts, value):
+        command, args = parts[0], parts[1:]
+        if command == b"get":
+            lines = [
+                b"VALUE %s 0 %d\r\n%s\r\n" % (key, len(self.data[key]), self.data[key])
+                for key in args if key in self.data
+            ]
+            return b"".join(lines) + b"END\r\n"
+        key = args[0]
+        if command == b"set":
+            self.data[key] = value
+            self.expires[key] = int(args[2])
+            return b"STORED\r\n"
+        if command == b"add":
+            if key in self.data:
+                return b"NOT_STORED\r\n"
+            self.data[key] = value
+            self.expires[key] = int(args[2])
+            return b"STORED\r\n"
+        if command == b"append":
+            if key not in self.data:
+                return b"NOT_STORED\r\n"
+            self.data[key] += value
+            return b"STORED\r\n"
+        if command == b"delete":
+            return b"DELETED\r\n" if self.data.pop(key, None) is not None else b"NOT_FOUND\r\n"
+        if command == b"touch":
+            if key not in self.data:
+                return b"NOT_FOUND\r\n"
+            self.expires[key] = int(args[1])
+            return b"TOUCHED\r\n"
+        return b"ERROR\r\n"
@@ -0,0 +1,116 @@
+import json
+
+import pytest
+from sqlalchemy import Column, String
+
+from apps import app
+from base.batch import InvalidBatch, STATUS_NOT_RUN, batch_route, parse_batch
+from base.config import settings
+from base.controllers import BaseController, CreateMixin
+from base.models import SystemModel
+from base.schema import BaseSchema
+from tests.fakes import run, make_request
+
+
+class BatchNote(SystemModel):
+    __tablename__ = "test_batch_note"
+
+    text = Column(String(40), unique=True, nullable=False)
+
+
+class BatchNoteSchema(BaseSchema):
+    class Meta:
+        model = BatchNote
+        fields = ("id", "text")
+
+
+class BatchNoteController(BaseController, CreateMixin):
+    model = BatchNote
+    schema_class = BatchNoteSchema
+
+
+app.add_route(BatchNoteController.as_view(), "/test-batch-notes", methods=["POST"])
+
+
+def post_batch(body):
+    request = make_request("/api/batch", "POST", body=body)
+    # Anonymous, without a session lookup
+    request.user = None
+    resp = run(batch_route(request))
+    return resp.status, json.loads(resp.body)
+
+
+def note(text):
+    return {"method": "POST", "path": "/api/test-batch-notes", "body": {"text": text}}
+
+
+@pytest.mark.parametrize("data, field", [
+    ([], "requests"),
+    ({}, "requests"),
+    ({"requests": {}}, "requests"),
+    ({"requests": []}, "requests"),
+    ({"requests": [1]}, "requests.0"),
+    ({"requests": [{"path": "/api/q"}, {"method": "HEAD", "path": "/api/q"}]}, "requests.1.method"),
+    ({"requests": [{"path": "api/q"}]}, "requests.0.path"),
+    ({"requests": [{"path": "/api/q", "query": "a=1"}]}, "requests.0"),
+    ({"requests": [{"path": "/api/q", "headers": []}]}, "requests.0"),
+])
+def test_invalid_batch(data, field):
+    with pytest.raises(InvalidBatch) as info:
+        parse_batch(data)
+    assert info.value.field == field
+
+
+def test_batch_size_is_bounded(monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_REQUESTS", 2)
+    with pytest.raises(InvalidBatch):
+        parse_batch({"requests": [{"path": "/api/q"}] * 3})
+    items, atomic = parse_batch({"requests": [{"path": "/api/q"}] * 2, "atomic": True})
+    assert items[0]["method"] == "GET"
+    assert atomic
+
+
+def test_invalid_batch_response():
+    status, body = post_batch({"requests": []})
+    assert status == 400
+
+
+def test_batch(questions, async_pool):
+    status, body = post_batch({"requests": [
+        {"path": "/api/q", "query": {"limit": 2}},
+        {"path": "/api/q", "query": {"id": 3}, "headers": {"Accept": "application/json"}},
+        {"path": "/api/nope"},
+        {"path": "/"},
+    ]})
+    assert status == 200
+    first, second, missing, not_controller = body["responses"]
+    assert first["status"] == 200
+    assert [item["id"] for item in first["body"]] == [1, 2]
+    assert "X-Next-Cursor" in first["headers"]
+    assert [item["id"] for item in second["body"]] == [3]
+    assert missing["status"] == 404
+    # Only routes of controllers can be batched
+    assert not_controller["status"] == 404
+
+
+def test_writes_of_a_batch(tables):
+    tables(BatchNote)
+    status, body = post_batch({"requests": [note("a"), note("a"), note("b")]})
+    assert [resp["status"] for resp in body["responses"]] == [201, 400, 201]
+    assert sorted(n.text for n in BatchNote.query.all()) == ["a", "b"]
+
+
+def test_atomic_batch(tables):
+    tables(BatchNote)
+    status, body = post_batch({"atomic": True, "requests": [note("a"), note("b")]})
+    assert [resp["status"] for resp in body["responses"]] == [201, 201]
+    assert body["responses"][1]["body"]["text"] == "b"
+    assert BatchNote.query.count() == 2
+
+
+def test_atomic_batch_is_rolled_back(tables):
+    tables(BatchNote)
+    status, body = post_batch({"atomic": True, "requests": [note("a"), note("a"), note("b")]})
+    assert status == 200
+    assert [resp["status"] for resp in body["responses"]] == [201, 400, STATUS_NOT_RUN]
+    assert BatchNote.query.count() == 0
@@ -0,0 +1,86 @@
+import datetime
+
+from sanic import response
+from sqlalchemy import Column, DateTime, String
+
+from base.constants import READ_ENGINE_ASYNCPG
+from base.controllers import BaseController, ConditionalGetMixin, ListMixin, ModelMixin
+from base.db import db
+from base.models import SystemModel
+from base.schema import BaseSchema
+from tests.fakes import run, make_request, call_controller
+
+
+class Note(SystemModel):
+    __tablename__ = "test_etag_note"
+
+    text = Column(String(40))
+    updated_at = Column(DateTime)
+
+
+class NoteSchema(BaseSchema):
+    class Meta:
+        fields = ("id", "text", "updated_at")
+
+
+class NoteListController(BaseController, ListMixin):
+    model = Note
+    schema_class = NoteSchema
+    read_engine = READ_ENGINE_ASYNCPG
+    use_etags = True
+
+
+class NoteCountController(BaseController, ModelMixin, ConditionalGetMixin):
+    """
+    Sets `use_etags` without an ETag probe.
+    """
+    model = Note
+    use_etags = True
+
+    def handle_get(self, *args, **kwargs):
+        return self.get_read_response(lambda: response.json({"count": Note.query.count()}))
+
+
+def add_notes(count):
+    now = datetime.datetime(2020, 1, 1)
+    db.session.add_all([
+        Note(text="n%d" % i, updated_at=now + datetime.timedelta(minutes=i)) for i in range(count)
+    ])
+    db.session.commit()
+
+
+def test_asyncpg_etag_with_change_column(tables, async_pool):
+    tables(Note)
+    add_notes(3)
+
+    resp = run(call_controller(NoteListController, make_request("/api/notes")))
+    assert resp.status == 200
+    etag = resp.headers["ETag"]
+    assert "max(test_etag_note.updated_at)" in async_pool.queries[0]
+
+    request = make_request("/api/notes", headers={"If-None-Match": etag})
+    resp = run(call_controller(NoteListController, request))
+    assert resp.status == 304
+
+
+def test_asyncpg_etag_changes_with_rows(tables, async_pool):
+    tables(Note)
+    add_notes(2)
+    etag = run(call_controller(NoteListController, make_request("/api/notes"))).headers["ETag"]
+
+    note = Note.query.first()
+    note.updated_at = datetime.datetime(2021, 1, 1)
+    db.session.commit()
+
+    request = make_request("/api/notes", headers={"If-None-Match": etag})
+    resp = run(call_controller(NoteListController, request))
+    assert resp.status == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_no_etag_without_probe(tables):
+    tables(Note)
+    add_notes(1)
+    resp = run(call_controller(NoteCountController, make_request("/api/notes/count")))
+    assert resp.status == 200
+    assert "ETag" not in resp.headers
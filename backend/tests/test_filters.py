@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from apps.password.models import Question
+from apps.password.schema import QuestionSchema
+from base.controllers import BaseController, ListMixin
+from tests.fakes import run, make_request, call_controller
+
+
+class QuestionListController(BaseController, ListMixin):
+    model = Question
+    schema_class = QuestionSchema
+
+
+class FilteredQuestionListController(QuestionListController):
+    allowed_filters = ["id", "text"]
+    indexed_filters = ["id", "text"]
+
+
+def get_ids(controller_class, query):
+    resp = run(call_controller(controller_class, make_request("/api/q" + query)))
+    return resp.status, [item["id"] for item in json.loads(resp.body)] if resp.status == 200 else None
+
+
+@pytest.mark.parametrize("query, ids", [
+    ("?id=2", [2]),
+    ("?id__in=1,3", [1, 3]),
+    ("?id__range=2,3", [2, 3]),
+    ("?text__prefix=q4", [5]),
+    ("?text=q1&id=2", [2]),
+])
+def test_filters(questions, query, ids):
+    assert get_ids(FilteredQuestionListController, query) == (200, ids)
+
+
+@pytest.mark.parametrize("query", ["?_=123", "?id__like=1", "?data_type=STRING", "?id=x"])
+def test_invalid_filters(questions, query):
+    assert get_ids(FilteredQuestionListController, query)[0] == 400
+
+
+def test_controllers_without_filters_ignore_the_query_string(questions):
+    assert get_ids(QuestionListController, "?_=123&id=2") == (200, [1, 2, 3, 4, 5])
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+from base.memcache import AsyncMemcacheClient, MemcacheError, encode_key, expire_after
+from tests.fakes import FakeMemcache, run
+
+
+def with_server(test, **client_options):
+    """
+    Runs `await test(server, client)` with a fake memcache server and a
+    client of it.
+    """
+    async def wrapped():
+        server = FakeMemcache()
+        await server.start()
+        client = AsyncMemcacheClient("127.0.0.1", server.port, **client_options)
+        try:
+            await test(server, client)
+        finally:
+            await client.close()
+            await server.stop()
+
+    run(wrapped())
+
+
+def test_encode_key():
+    assert encode_key("session:1") == b"session:1"
+    for key in ("", "a b", "a\nb", "x" * 251):
+        with pytest.raises(ValueError):
+            encode_key(key)
+
+
+def test_expire_after():
+    assert expire_after(60) == 60
+    assert expire_after(31 * 24 * 3600) > 31 * 24 * 3600 * 10
+
+
+def test_commands():
+    async def test(server, client):
+        assert await client.get("a") is None
+        assert await client.set("a", "1", expire=30)
+        assert await client.get("a") == b"1"
+        assert server.expires[b"a"] == 30
+        assert not await client.add("a", "2")
+        assert await client.add("b", b"2")
+        assert await client.append("b", "3")
+        assert not await client.append("c", "3")
+        assert await client.get("b") == b"23"
+        assert await client.touch("a", 60)
+        assert not await client.touch("c", 60)
+        assert await client.delete("a")
+        assert not await client.delete("a")
+
+    with_server(test)
+
+
+def test_many_commands_are_pipelined():
+    async def test(server, client):
+        assert await client.set_many({"a": 1, "b": 2, "c": 3}) == {"a": True, "b": True, "c": True}
+        assert await client.get_many(["a", "b", "x"]) == {"a": b"1", "b": b"2"}
+        assert await client.touch_many(["a", "x"], 10) == {"a": True, "x": False}
+        assert await client.delete_many(["b", "x"]) == {"b": True, "x": False}
+        assert await client.get_many([]) == {}
+        # All of them went through one connection
+        assert server.connections == 1
+
+    with_server(test)
+
+
+def test_values_with_line_breaks():
+    async def test(server, client):
+        await client.set("a", b"1\r\nEND\r\n")
+        assert await client.get("a") == b"1\r\nEND\r\n"
+
+    with_server(test)
+
+
+def test_pool_size_is_bounded():
+    async def test(server, client):
+        await client.set("a", "1")
+        results = await asyncio.gather(*[client.get("a") for _ in range(20)])
+        assert results == [b"1"] * 20
+        assert server.connections <= 2
+
+    with_server(test, pool_size=2)
+
+
+def test_timeout():
+    async def test(server, client):
+        server.hang = True
+        with pytest.raises(MemcacheError):
+            await client.get("a")
+        # The connection that timed out is not reused
+        server.hang = False
+        assert await client.set("a", "1")
+        assert server.connections == 2
+
+    with_server(test, timeout=0.1)
+
+
+def test_reads_are_retried_on_a_new_connection():
+    async def test(server, client):
+        await client.set("a", "1")
+        # Closed by the server while it was idle in the pool
+        server.drop_connections()
+        await asyncio.sleep(0.01)
+        assert await client.get("a") == b"1"
+        assert server.connections == 2
+
+    with_server(test)
+
+
+def test_server_down():
+    async def test():
+        client = AsyncMemcacheClient("127.0.0.1", 1, timeout=0.5)
+        with pytest.raises(MemcacheError):
+            await client.get("a")
+        await client.close()
+
+    run(test())
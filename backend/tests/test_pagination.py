@@ -0,0 +1,150 @@
+import datetime
+import json
+
+import pytest
+from sqlalchemy import Column, DateTime
+
+from apps.password.models import Question, QuestionDataType
+from apps.password.schema import QuestionSchema
+from base.constants import READ_ENGINE_CORE
+from base.controllers import BaseController, ListMixin
+from base.db import db
+from base.pagination import InvalidPageArgument, KeysetPage, decode_cursor, encode_cursor
+from tests.fakes import run, make_request, call_controller
+
+
+class QuestionPageController(BaseController, ListMixin):
+    model = Question
+    schema_class = QuestionSchema
+    page_size = 2
+    max_page_size = 3
+
+
+class QuestionTextPageController(QuestionPageController):
+    sort_column = Question.text
+
+
+class QuestionCorePageController(QuestionTextPageController):
+    read_engine = READ_ENGINE_CORE
+
+
+class QuestionColumnPageController(QuestionPageController):
+    read_engine = READ_ENGINE_CORE
+    sort_column = Question.__table__.c.text
+
+
+def test_cursor_round_trip():
+    columns = [Column("at", DateTime), Question.data_type, Question.id]
+    values = [datetime.datetime(2020, 1, 2, 3, 4, 5), QuestionDataType.STRING, 7]
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, columns) == values
+
+
+@pytest.mark.parametrize("cursor", [encode_cursor([1, 2]), encode_cursor({"id": 1}), "!!", "bm9wZQ"])
+def test_cursor_that_does_not_match(cursor):
+    with pytest.raises((ValueError, TypeError, KeyError)):
+        decode_cursor(cursor, [Question.id])
+
+
+def test_page_from_args():
+    page = KeysetPage.from_args({}, [Question.id], 50, 200)
+    assert page.limit == 50 and page.after is None and page.before is None
+    assert page.fetch_limit == 51
+
+    page = KeysetPage.from_args({"limit": "500", "after": encode_cursor([3])}, [Question.id], 50, 200)
+    assert page.limit == 200
+    assert page.after == [3]
+
+
+@pytest.mark.parametrize("args, field", [
+    ({"limit": "x"}, "limit"),
+    ({"limit": "0"}, "limit"),
+    ({"after": "!!"}, "after"),
+    ({"before": encode_cursor(["a", 1])}, "before"),
+    ({"after": encode_cursor([1]), "before": encode_cursor([5])}, "before"),
+])
+def test_invalid_page_args(args, field):
+    with pytest.raises(InvalidPageArgument) as info:
+        KeysetPage.from_args(args, [Question.id], 50, 200)
+    assert info.value.args[0] == field
+
+
+def make_rows(*ids):
+    return [Question(id=i) for i in ids]
+
+
+def test_finish_first_page():
+    page = KeysetPage([Question.id], 2)
+    rows = page.finish(make_rows(1, 2, 3))
+    assert [row.id for row in rows] == [1, 2]
+    assert decode_cursor(page.next_cursor, [Question.id]) == [2]
+    assert page.prev_cursor is None
+
+
+def test_finish_last_page():
+    page = KeysetPage([Question.id], 2, after=[2])
+    rows = page.finish(make_rows(3))
+    assert [row.id for row in rows] == [3]
+    assert page.next_cursor is None
+    assert decode_cursor(page.prev_cursor, [Question.id]) == [3]
+
+
+def test_finish_page_before():
+    # Read backwards from the cursor
+    page = KeysetPage([Question.id], 2, before=[4])
+    rows = page.finish(make_rows(3, 2, 1))
+    assert [row.id for row in rows] == [2, 3]
+    assert decode_cursor(page.next_cursor, [Question.id]) == [3]
+    assert decode_cursor(page.prev_cursor, [Question.id]) == [2]
+
+
+def read_pages(controller_class):
+    """
+    Returns the ids of each page of the list, following the next cursors.
+    """
+    pages = []
+    query = "?limit=2"
+    while True:
+        resp = run(call_controller(controller_class, make_request("/api/q" + query)))
+        assert resp.status == 200
+        pages.append([item["id"] for item in json.loads(resp.body)])
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages, resp
+        query = "?limit=2&after=%s" % cursor
+
+
+@pytest.mark.parametrize("controller_class", [
+    QuestionPageController,
+    QuestionTextPageController,
+    QuestionCorePageController,
+    QuestionColumnPageController,
+])
+def test_list_pages(questions, controller_class):
+    pages, last = read_pages(controller_class)
+    assert pages == [[1, 2], [3, 4], [5]]
+
+    # And back from the last page
+    request = make_request("/api/q?limit=2&before=%s" % last.headers["X-Prev-Cursor"])
+    resp = run(call_controller(controller_class, request))
+    assert [item["id"] for item in json.loads(resp.body)] == [3, 4]
+    assert "X-Prev-Cursor" in resp.headers
+
+
+def test_list_page_size_is_bounded(questions):
+    resp = run(call_controller(QuestionPageController, make_request("/api/q?limit=10")))
+    assert len(json.loads(resp.body)) == 3
+
+
+def test_list_invalid_cursor(questions):
+    resp = run(call_controller(QuestionPageController, make_request("/api/q?after=nope")))
+    assert resp.status == 400
+
+
+@pytest.mark.parametrize("controller_class", [QuestionTextPageController, QuestionCorePageController])
+def test_list_pages_by_sort_column(questions, controller_class):
+    questions[0].text = "z"
+    db.session.commit()
+    pages, _ = read_pages(controller_class)
+    assert pages == [[2, 3], [4, 5], [1]]
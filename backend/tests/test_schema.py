@@ -0,0 +1,140 @@
+import pytest
+from marshmallow import Schema, post_load, pre_load, validates_schema
+from marshmallow.validate import Length
+
+from apps.password.schema import AnswerSchema
+from base import schema_fields as fields
+from base.schema import CompiledSchema, compile_loader
+
+
+class ItemSchema(CompiledSchema):
+    name = fields.String(required=True, validate=Length(max=5))
+    count = fields.Integer(missing=1)
+    note = fields.String(allow_none=True, load_from="comment")
+    secret = fields.String(dump_only=True)
+
+
+class MarshmallowItemSchema(ItemSchema):
+    compile_loads = False
+
+
+def load_both(data, **kwargs):
+    """
+    Returns what the compiled loader and marshmallow load from the data.
+    """
+    many = kwargs.pop("many", None)
+    partial = kwargs.pop("partial", None)
+    compiled = ItemSchema(**kwargs).load(data, many=many, partial=partial)
+    expected = MarshmallowItemSchema(**kwargs).load(data, many=many, partial=partial)
+    return compiled, expected
+
+
+def test_compile_loader():
+    load = compile_loader(ItemSchema())
+    schema = ItemSchema()
+    assert load({"name": "a", "count": "2"}, schema.fields) == {"name": "a", "count": 2}
+    for data in ({}, {"name": 1}, {"name": None}, {"name": "a", "count": "x"}, []):
+        with pytest.raises(Exception):
+            load(data, schema.fields)
+
+
+def test_schemas_that_are_not_compiled():
+    class PreLoadSchema(CompiledSchema):
+        name = fields.String()
+
+        @pre_load
+        def strip(self, data):
+            return data
+
+    class ValidatedSchema(CompiledSchema):
+        name = fields.String()
+
+        @validates_schema
+        def check(self, data):
+            pass
+
+    assert compile_loader(PreLoadSchema()) is None
+    assert compile_loader(ValidatedSchema()) is None
+    assert compile_loader(ItemSchema(strict=True)) is None
+    # Loaded by marshmallow
+    assert PreLoadSchema().load({"name": "a"}).data == {"name": "a"}
+
+
+@pytest.mark.parametrize("data", [
+    {"name": "a"},
+    {"name": "a", "count": 3, "comment": "c"},
+    {"name": "a", "note": None, "secret": "s", "other": 1},
+    {"name": "a", "note": "n", "comment": "c"},
+])
+def test_same_results_as_marshmallow(data):
+    compiled, expected = load_both(data)
+    assert compiled == expected
+    assert not compiled.errors
+
+
+@pytest.mark.parametrize("data", [
+    {},
+    {"name": "toolong"},
+    {"name": None},
+    {"name": 1},
+    {"name": "a", "count": "x"},
+    {"name": "a", "count": None},
+    "not a dict",
+])
+def test_invalid_input_reports_marshmallow_errors(data):
+    compiled, expected = load_both(data)
+    assert compiled.errors
+    assert compiled == expected
+
+
+@pytest.mark.parametrize("data", [{"count": 2}, {}, {"name": "toolong"}])
+def test_partial_loads(data):
+    compiled, expected = load_both(data, partial=True)
+    assert compiled == expected
+    # Defaults are not filled in
+    if "count" not in data:
+        assert "count" not in compiled.data
+
+
+def test_partial_loads_of_some_fields():
+    compiled, expected = load_both({"count": 2}, partial=("name",))
+    assert compiled == expected
+
+
+def test_many():
+    data = [{"name": "a"}, {"name": "b", "count": 2}]
+    assert load_both(data, many=True)[0] == load_both(data, many=True)[1]
+    compiled, expected = load_both([{"name": "a"}, {}], many=True)
+    assert compiled.errors and compiled == expected
+
+
+def test_instance_options_are_compiled_separately():
+    data = {"name": "a", "count": 2}
+    assert ItemSchema().load(data).data == {"name": "a", "count": 2}
+    assert ItemSchema(dump_only=("count",)).load(data).data == {"name": "a"}
+    assert ItemSchema(only=("name",)).load(data).data == {"name": "a"}
+    assert ItemSchema().load(data).data == {"name": "a", "count": 2}
+
+
+def test_nested():
+    data = {"password_id": "1", "answers": [{"question_id": "2", "answer": "x"}]}
+    compiled = AnswerSchema().load(data)
+    assert compiled.data == {"password_id": "1", "answers": [{"question_id": 2, "answer": "x"}]}
+
+    data["answers"].append({"question_id": "y"})
+    assert AnswerSchema().load(data).errors == Schema.load(AnswerSchema(), data).errors
+
+
+def test_postprocess():
+    class TupleSchema(CompiledSchema):
+        name = fields.String()
+
+        @post_load
+        def make_tuple(self, data):
+            return (data["name"],)
+
+    schema = TupleSchema()
+    assert schema.load({"name": "a"}).data == ("a",)
+    result = schema.load({"name": "a"}, postprocess=False)
+    assert result.data == {"name": "a"}
+    assert schema.postprocess_load(result, {"name": "a"}).data == ("a",)
@@ -0,0 +1,123 @@
+import time
+
+import pytest
+
+from base.config import settings
+from base.memcache import AsyncMemcacheClient
+from base.tokens import (
+    TokenDenylist, is_signed_token, sign_token, verify_token, token_denylist
+)
+from tests.fakes import FakeMemcache, run
+
+
+@pytest.fixture
+def denylist(monkeypatch):
+    monkeypatch.setattr(token_denylist, "_TokenDenylist__revoked", {})
+    return token_denylist
+
+
+def test_sign_and_verify():
+    token = sign_token(42)
+    assert is_signed_token(token)
+    claims = verify_token(token)
+    assert claims.user_id == 42
+    assert claims.expires_at > time.time()
+
+
+def test_tampered_token():
+    token = sign_token(42)
+    message, _, signature = token.rpartition(".")
+    other = message.replace(".42.", ".43.")
+    assert verify_token("%s.%s" % (other, signature)) is None
+    assert verify_token(token[:-2] + "xx") is None
+
+
+@pytest.mark.parametrize("signature", ["é", "☃" * 43, "", "a.b"])
+def test_signature_that_is_not_ascii(signature):
+    message = sign_token(42).rpartition(".")[0]
+    assert verify_token("%s.%s" % (message, signature)) is None
+
+
+@pytest.mark.parametrize("token", ["s1", "s1.", "s1.x.y", "s1.a.b.c.d.e.f", "nope"])
+def test_malformed_token(token):
+    assert verify_token(token) is None
+
+
+def test_expired_token():
+    assert verify_token(sign_token(42, ttl=-1)) is None
+
+
+def test_key_rotation(monkeypatch):
+    token = sign_token(42)
+    old_key = settings.SECRET_KEY
+    monkeypatch.setattr(settings, "SECRET_KEY", "a new key")
+    assert verify_token(token) is None
+
+    monkeypatch.setattr(settings, "SECRET_KEY_FALLBACKS", [old_key])
+    assert verify_token(token).user_id == 42
+    # New tokens are signed with the new key
+    assert verify_token(sign_token(7)).user_id == 7
+
+
+def test_revoke_and_sync(denylist):
+    async def check():
+        server = FakeMemcache()
+        await server.start()
+        store = AsyncMemcacheClient("127.0.0.1", server.port)
+        try:
+            first, second = verify_token(sign_token(1)), verify_token(sign_token(2))
+            await denylist.revoke(store, first)
+            await denylist.revoke(store, second)
+            assert denylist.is_revoked(first) and denylist.is_revoked(second)
+            # Both ids are in the same bucket of the store
+            assert len(server.data) == 1
+
+            # Another process learns them on its next sync
+            denylist._TokenDenylist__revoked = {}
+            assert not denylist.is_revoked(first)
+            await denylist.sync(store)
+            assert denylist.is_revoked(first) and denylist.is_revoked(second)
+            assert not denylist.is_revoked(verify_token(sign_token(3)))
+        finally:
+            await store.close()
+            await server.stop()
+
+    run(check())
+
+
+def test_sync_keeps_local_ids(denylist):
+    async def check():
+        server = FakeMemcache()
+        await server.start()
+        store = AsyncMemcacheClient("127.0.0.1", server.port)
+        try:
+            claims = verify_token(sign_token(1))
+            await denylist.revoke(store, claims)
+            # Lost by the store
+            server.data.clear()
+            await denylist.sync(store)
+            assert denylist.is_revoked(claims)
+        finally:
+            await store.close()
+            await server.stop()
+
+    run(check())
+
+
+def test_run_survives_errors(denylist, monkeypatch):
+    calls = []
+
+    class Store(object):
+        async def get_many(self, keys):
+            calls.append(keys)
+            if len(calls) == 1:
+                raise RuntimeError("not a store error")
+            raise TokenDenylistStop()
+
+    class TokenDenylistStop(BaseException):
+        pass
+
+    monkeypatch.setattr(settings, "TOKEN_DENYLIST_SYNC_INTERVAL", 0)
+    with pytest.raises(TokenDenylistStop):
+        run(TokenDenylist().run(Store()))
+    assert len(calls) == 2
@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import event
+
+from apps.password.models import Question, QuestionDataType
+from base.db import db
+from base.unit_of_work import save_batched
+
+
+@pytest.fixture
+def statements():
+    executed = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", listener)
+    yield executed
+    event.remove(db.engine, "before_cursor_execute", listener)
+
+
+def make_questions(count, prefix="q"):
+    return [
+        Question(text="%s%d" % (prefix, i), password_text="p", data_type=QuestionDataType.STRING)
+        for i in range(count)
+    ]
+
+
+def test_new_instances_in_one_insert(tables, returning, statements):
+    tables(Question)
+    items = make_questions(50)
+    save_batched(db.session, items)
+
+    inserts = [s for s in statements if s.startswith("INSERT")]
+    assert len(inserts) == 1
+    assert "RETURNING" in inserts[0]
+    assert sorted(item.id for item in items) == list(range(1, 51))
+    # Attached to the session as if they were loaded
+    assert all(item in db.session for item in items)
+    assert not db.session.new
+
+    db.session.commit()
+    assert Question.query.count() == 50
+    assert Question.query.get(7).text == items[6].text
+
+
+def test_one_insert_per_set_of_attributes(tables, returning, statements):
+    tables(Question)
+    items = make_questions(3) + [Question(text="r", password_text="p", related_id=None)]
+    save_batched(db.session, items)
+    db.session.commit()
+
+    assert len([s for s in statements if s.startswith("INSERT")]) == 2
+    assert Question.query.count() == 4
+
+
+def test_existing_instances_are_flushed(tables, returning):
+    tables(Question)
+    items = make_questions(2)
+    save_batched(db.session, items)
+    db.session.commit()
+
+    items[0].text = "changed"
+    new = make_questions(1, prefix="new")
+    save_batched(db.session, [items[0]] + new)
+    db.session.commit()
+    db.session.expire_all()
+    assert Question.query.get(items[0].id).text == "changed"
+    assert new[0].id == 3
+
+
+def test_without_returning(tables, statements):
+    tables(Question)
+    items = make_questions(3)
+    save_batched(db.session, items)
+    db.session.commit()
+
+    assert all("RETURNING" not in s for s in statements)
+    assert sorted(item.id for item in items) == [1, 2, 3]
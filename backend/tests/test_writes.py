@@ -0,0 +1,208 @@
+import json
+from collections import namedtuple
+
+import pytest
+from sqlalchemy import Column, Integer, String
+
+from base.controllers import BaseController, DeleteMixin, UpdateMixin
+from base.db import db
+from base.models import SystemModel
+from base.schema import BaseSchema
+from tests.fakes import run, make_request, call_controller
+
+
+User = namedtuple("User", ("id",))
+
+
+class Task(SystemModel):
+    __tablename__ = "test_write_task"
+
+    text = Column(String(40), nullable=False)
+    grp = Column(String(10))
+    created_by_id = Column(Integer)
+    version = Column(Integer, nullable=False, default=1)
+
+
+class TaskSchema(BaseSchema):
+    class Meta:
+        model = Task
+        fields = ("id", "text", "grp", "created_by_id", "version")
+
+
+class TaskDeleteController(BaseController, DeleteMixin):
+    model = Task
+    url_parts = {"task_id": Task.id}
+
+
+class GroupDeleteController(TaskDeleteController):
+    url_parts = {"grp": Task.grp}
+
+
+class OwnTaskDeleteController(TaskDeleteController):
+    filter_by_creator = True
+
+
+class BulkTaskDeleteController(OwnTaskDeleteController):
+    allow_bulk_delete = True
+    allowed_filters = ["grp"]
+    indexed_filters = ["grp"]
+
+
+class TaskUpdateController(BaseController, UpdateMixin):
+    model = Task
+    schema_class = TaskSchema
+    url_parts = {"task_id": Task.id}
+
+
+class GroupUpdateController(TaskUpdateController):
+    url_parts = {"grp": Task.grp}
+
+
+class OwnTaskUpdateController(TaskUpdateController):
+    filter_by_creator = True
+
+
+class VersionedTaskUpdateController(TaskUpdateController):
+    version_column = "version"
+
+
+@pytest.fixture
+def tasks(tables):
+    tables(Task)
+    db.session.add_all([
+        Task(text="a", grp="x", created_by_id=1),
+        Task(text="b", grp="x", created_by_id=1),
+        Task(text="c", grp="y", created_by_id=2),
+    ])
+    db.session.commit()
+
+
+def call(controller_class, method, path="/api/tasks", user=None, body=None, **kwargs):
+    request = make_request(path, method, body=body)
+    request.user = user
+    resp = run(call_controller(controller_class, request, **kwargs))
+    return resp.status, json.loads(resp.body) if resp.body else None
+
+
+def task_texts():
+    db.session.expire_all()
+    return sorted(task.text for task in Task.query.all())
+
+
+def test_delete(tasks):
+    assert call(TaskDeleteController, "DELETE", task_id=2) == (200, {"deleted": 1})
+    assert task_texts() == ["a", "c"]
+    assert call(TaskDeleteController, "DELETE", task_id=2)[0] == 404
+
+
+def test_delete_needs_url_parts(tasks):
+    assert call(TaskDeleteController, "DELETE")[0] == 400
+    assert task_texts() == ["a", "b", "c"]
+
+
+def test_delete_of_several_items(tasks):
+    assert call(GroupDeleteController, "DELETE", grp="x")[0] == 400
+    assert task_texts() == ["a", "b", "c"]
+    assert call(GroupDeleteController, "DELETE", grp="y") == (200, {"deleted": 1})
+
+
+def test_delete_by_creator(tasks):
+    assert call(OwnTaskDeleteController, "DELETE", user=User(2), task_id=1)[0] == 404
+    assert call(OwnTaskDeleteController, "DELETE", user=User(1), task_id=1)[0] == 200
+    assert task_texts() == ["b", "c"]
+
+
+def test_delete_by_creator_needs_url_parts(tasks):
+    # The creator filter alone would delete all the tasks of the user
+    assert call(OwnTaskDeleteController, "DELETE", user=User(1))[0] == 400
+    assert task_texts() == ["a", "b", "c"]
+
+
+def test_anonymous_delete_by_creator(tasks):
+    assert call(OwnTaskDeleteController, "DELETE", task_id=1)[0] == 401
+    assert task_texts() == ["a", "b", "c"]
+
+
+def test_bulk_delete(tasks):
+    status, body = call(BulkTaskDeleteController, "DELETE", "/api/tasks?grp=x", user=User(1))
+    assert (status, body) == (200, {"deleted": 2})
+    assert task_texts() == ["c"]
+
+
+def test_bulk_delete_with_json_filters(tasks):
+    status, body = call(BulkTaskDeleteController, "DELETE", user=User(2), body={"grp__in": ["x", "y"]})
+    assert (status, body) == (200, {"deleted": 1})
+    assert task_texts() == ["a", "b"]
+
+
+def test_bulk_delete_needs_a_filter(tasks):
+    assert call(BulkTaskDeleteController, "DELETE", user=User(1))[0] == 400
+    assert call(BulkTaskDeleteController, "DELETE", "/api/tasks?text=a", user=User(1))[0] == 400
+    assert task_texts() == ["a", "b", "c"]
+
+
+def test_patch(tasks):
+    status, body = call(TaskUpdateController, "PATCH", body={"text": "new"}, task_id=2)
+    assert status == 200
+    assert body["id"] == 2 and body["text"] == "new" and body["grp"] == "x"
+    assert task_texts() == ["a", "c", "new"]
+
+
+def test_patch_with_returning(tasks, returning):
+    status, body = call(TaskUpdateController, "PATCH", body={"grp": "z"}, task_id=1)
+    assert status == 200
+    assert body["text"] == "a" and body["grp"] == "z"
+
+
+@pytest.mark.parametrize("body", [["text"], None, {"other": 1}, {}, {"id": 5}])
+def test_invalid_patch(tasks, body):
+    assert call(TaskUpdateController, "PATCH", body=body, task_id=1)[0] == 400
+    assert task_texts() == ["a", "b", "c"]
+
+
+def test_patch_of_missing_item(tasks):
+    assert call(TaskUpdateController, "PATCH", body={"text": "new"}, task_id=9)[0] == 404
+
+
+def test_patch_needs_url_parts(tasks):
+    assert call(TaskUpdateController, "PATCH", body={"text": "new"})[0] == 400
+    assert call(OwnTaskUpdateController, "PATCH", user=User(1), body={"text": "new"})[0] == 400
+    assert task_texts() == ["a", "b", "c"]
+
+
+def test_patch_of_several_items(tasks):
+    assert call(GroupUpdateController, "PATCH", body={"text": "new"}, grp="x")[0] == 400
+    assert task_texts() == ["a", "b", "c"]
+
+
+def test_patch_by_creator(tasks):
+    assert call(OwnTaskUpdateController, "PATCH", user=User(2), body={"text": "new"}, task_id=1)[0] == 404
+    assert call(OwnTaskUpdateController, "PATCH", user=User(1), body={"text": "new"}, task_id=1)[0] == 200
+    assert task_texts() == ["b", "c", "new"]
+
+
+def test_anonymous_patch_by_creator(tasks):
+    assert call(OwnTaskUpdateController, "PATCH", body={"text": "new"}, task_id=1)[0] == 401
+    assert task_texts() == ["a", "b", "c"]
+
+
+def test_patch_with_version(tasks):
+    status, body = call(VersionedTaskUpdateController, "PATCH", body={"text": "new", "version": 1}, task_id=1)
+    assert status == 200
+    assert body["version"] == 2
+
+    # Another client read the same version
+    status, body = call(VersionedTaskUpdateController, "PATCH", body={"text": "old", "version": 1}, task_id=1)
+    assert status == 409
+    assert task_texts() == ["b", "c", "new"]
+
+    assert call(VersionedTaskUpdateController, "PATCH", body={"text": "x", "version": 1}, task_id=9)[0] == 404
+
+
+@pytest.mark.parametrize("version", [None, "1", 1.5])
+def test_patch_without_version(tasks, version):
+    body = {"text": "new"}
+    if version is not None:
+        body["version"] = version
+    assert call(VersionedTaskUpdateController, "PATCH", body=body, task_id=1)[0] == 400
+    assert task_texts() == ["a", "b", "c"]